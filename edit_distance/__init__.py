@@ -1 +1,9 @@
+from edit_distance.automaton import LevenshteinAutomaton, build_automaton
+from edit_distance.bktree import BKTree
+from edit_distance.deletion_index import DeletionIndex
 from edit_distance.edit_distance import *
+from edit_distance.incremental import IncrementalAligner, align_nbest
+from edit_distance.join import similarity_join
+from edit_distance.lexicon import Lexicon
+from edit_distance.qgram import QGramIndex
+from edit_distance.vptree import VPTree
@@ -0,0 +1,990 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The algorithms behind :py:func:`~edit_distance.edit_distance` and
+:py:func:`~edit_distance.edit_distance_backpointer`.
+"""
+
+import math
+import operator
+from collections.abc import Sequence
+from typing import Optional
+
+from edit_distance.actions import (
+    DELETE,
+    EQUAL,
+    INSERT,
+    REPLACE,
+    highest_match_action,
+    lowest_cost_action,
+)
+
+
+def trace_backpointers(lookup, x, y):
+    """Create opcodes from the best path ending at ``(x, y)``, where
+    ``lookup(x, y)`` returns the backpointer of a cell."""
+    opcodes = []
+    while x != 0 or y != 0:
+        this_bp = lookup(x, y)
+        if this_bp in [EQUAL, REPLACE]:
+            opcodes.append([this_bp, x - 1, x, y - 1, y])
+            x = x - 1
+            y = y - 1
+        elif this_bp == INSERT:
+            opcodes.append([INSERT, x, x, y - 1, y])
+            y = y - 1
+        elif this_bp == DELETE:
+            opcodes.append([DELETE, x - 1, x, y, y])
+            x = x - 1
+        else:
+            raise Exception("Invalid dynamic programming action in BP table!")
+    opcodes.reverse()
+    return opcodes
+
+
+class BackpointerTable:
+    """
+    A table of backpointers, stored at 2 bits per cell.  Rows are filled in
+    one at a time as a :py:class:`bytearray` with one action code (an index
+    into :py:data:`ACTIONS`) per cell, and packed when they're added, so the
+    whole table takes about a quarter of a byte per cell.
+    """
+
+    def __init__(self, width: int):
+        """An empty table whose rows have ``width`` cells."""
+        self.width = width
+        self.rows: list = []
+
+    def append(self, row: bytearray) -> None:
+        """Pack and add a row of action codes."""
+        if len(row) % 4:
+            row = row + bytes(-len(row) % 4)
+        # Codes fit in 2 bits, so each of the four interleaved slices can be
+        # shifted into place within its bytes all at once.
+        packed = 0
+        for k in range(4):
+            packed |= int.from_bytes(row[k::4], "little") << (2 * k)
+        self.rows.append(packed.to_bytes(len(row) // 4, "little"))
+
+    def action(self, i: int, j: int) -> str:
+        """The action in cell ``(i, j)``."""
+        return ACTIONS[(self.rows[i][j >> 2] >> ((j & 3) << 1)) & 3]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+# The actions in a BackpointerTable are stored as their index in this tuple.
+ACTIONS = (EQUAL, REPLACE, INSERT, DELETE)
+EQUAL_CODE, REPLACE_CODE, INSERT_CODE, DELETE_CODE = range(4)
+
+
+# pylint: disable-next=too-many-branches,too-many-statements
+def banded(seq1, seq2, test, max_distance, opcodes):
+    """Ukkonen's cutoff: the edit distance with :py:func:`lowest_cost_action`,
+    computing only the cells within ``max_distance`` of the main diagonal.
+
+    Any alignment passing outside of the band costs more than
+    ``max_distance``, so cells in the band whose distance is at most
+    ``max_distance`` (and their backpointers) are the same as in the full
+    table.  Anything larger is only known to be larger, which is all that the
+    caller needs.  Returns ``(distance, matches)`` (plus the opcodes if
+    ``opcodes``) or a distance greater than ``max_distance``."""
+    m = len(seq1)
+    n = len(seq2)
+    k = max_distance
+    big = k + 1  # stands for "more than max_distance"
+    d0 = [j if j <= k else big for j in range(n + 1)]
+    d1 = [big] * (n + 1)
+    m0 = [0] * (n + 1)
+    m1 = [0] * (n + 1)
+    # Backpointer rows only cover the band: cell (i, j) is at j - i + k
+    bp = None
+    row = None
+    if opcodes:
+        bp = BackpointerTable(2 * k + 1)
+        row = bytearray(2 * k + 1)
+        for j in range(1, min(n, k) + 1):
+            row[j + k] = INSERT_CODE
+        bp.append(row)
+    for i in range(1, m + 1):
+        lo = max(1, i - k)
+        hi = min(n, i + k)
+        if row is not None:
+            row = bytearray(2 * k + 1)
+        # The cell just left of the band is either column 0 or outside of it.
+        if lo == 1 and i <= k:
+            d1[0] = i
+            if row is not None:
+                row[k - i] = DELETE_CODE
+        else:
+            d1[lo - 1] = big
+        m1[lo - 1] = 0
+        row_min = d1[lo - 1]
+        a = seq1[i - 1]
+        for j in range(lo, hi + 1):
+            cost = 0 if test(a, seq2[j - 1]) else 1
+            ins_cost = d1[j - 1] + 1
+            del_cost = d0[j] + 1
+            sub_cost = d0[j - 1] + cost
+            # Same choice as lowest_cost_action
+            if sub_cost <= ins_cost and sub_cost <= del_cost:
+                d1[j] = sub_cost
+                m1[j] = m0[j - 1] + 1 - cost
+                action = cost  # REPLACE_CODE or EQUAL_CODE
+            elif ins_cost <= del_cost:
+                d1[j] = ins_cost
+                m1[j] = m1[j - 1]
+                action = INSERT_CODE
+            else:
+                d1[j] = del_cost
+                m1[j] = m0[j]
+                action = DELETE_CODE
+            if row is not None:
+                row[j - i + k] = action
+            if d1[j] < row_min:
+                row_min = d1[j]
+        if bp is not None:
+            bp.append(row)
+        if row_min > k:
+            return (big, None, None) if opcodes else (big, None)
+        # The next row reads this one just past the band, which isn't computed.
+        if hi < n:
+            d1[hi + 1] = big
+        d0, d1 = d1, d0
+        m0, m1 = m1, m0
+    if d0[n] > k:
+        return (big, None, None) if opcodes else (big, None)
+    if bp is None:
+        return d0[n], m0[n]
+    band = bp
+    return (
+        d0[n],
+        m0[n],
+        trace_backpointers(lambda x, y: band.action(x, y - x + k), m, n),
+    )
+
+
+def common_affixes(seq1, seq2, action_function, test):
+    """The lengths of the common prefix and of the (non-overlapping) common
+    suffix of the two sequences, if it's safe to leave them out of the dynamic
+    program, otherwise ``(0, 0)``.
+
+    With :py:func:`lowest_cost_action` and :py:func:`highest_match_action` a
+    match at the end of both sequences is always taken, and the table for the
+    rest after a common prefix of length ``p`` is the table of the remainders
+    (shifted by ``p`` matches, for the latter).  Only the path through the
+    prefix can differ; see :py:func:`untrim_opcodes`."""
+    if action_function is not lowest_cost_action:
+        if action_function is not highest_match_action:
+            return 0, 0
+    m = len(seq1)
+    n = len(seq2)
+    limit = min(m, n)
+    prefix = 0
+    while prefix < limit and test(seq1[prefix], seq2[prefix]):
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and test(seq1[m - 1 - suffix], seq2[n - 1 - suffix]):
+        suffix += 1
+    return prefix, suffix
+
+
+def trim(seq, start, stop):
+    """``seq[start:stop]``, or a list of those elements if ``seq`` can only be
+    indexed with integers (like a :py:class:`collections.deque`)."""
+    try:
+        return seq[start:stop]
+    except TypeError:
+        return [seq[i] for i in range(start, stop)]
+
+
+# pylint: disable-next=too-many-positional-arguments
+def untrim_opcodes(seq1, seq2, test, prefix, suffix, opcodes):
+    """Turn the opcodes for the sequences without their common prefix and
+    suffix into the opcodes for the whole sequences.
+
+    The path for the middle part ends up at ``(0, y)`` or ``(x, 0)``, then goes
+    straight to the origin.  In the whole table that's cell
+    ``(prefix, prefix + y)``, from which the path can take matches against the
+    prefix rather than going straight along the boundary: ``D[i][j]`` is
+    ``j - i`` there (or ``i - j`` below the diagonal), so a match is taken
+    whenever there is one, and otherwise we insert (or delete)."""
+    lead = 0
+    for tag, i1, _, j1, _ in opcodes:
+        if not (tag == INSERT and i1 == 0 or tag == DELETE and j1 == 0):
+            break
+        lead += 1
+    i = j = prefix
+    if lead and opcodes[0][0] == INSERT:
+        j += lead
+    else:
+        i += lead
+    result = []
+    while i or j:
+        if i and j and test(seq1[i - 1], seq2[j - 1]):
+            action = EQUAL
+        elif j > i:
+            action = INSERT
+        else:
+            action = DELETE
+        result.append(opcode(action, i, j))
+        if action != INSERT:
+            i -= 1
+        if action != DELETE:
+            j -= 1
+    result.reverse()
+    for tag, i1, i2, j1, j2 in opcodes[lead:]:
+        result.append([tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix])
+    i = len(seq1) - suffix
+    j = len(seq2) - suffix
+    result.extend([EQUAL, i + k, i + k + 1, j + k, j + k + 1] for k in range(suffix))
+    return result
+
+
+# pylint: disable-next=too-many-positional-arguments
+def fast_alignment(
+    seq1, seq2, action_function, test, opcodes=False, linear_space=None, masks=None
+):
+    """Compute ``(distance, matches, opcodes)`` with the diagonal transition
+    or bit-parallel engines, or return ``None`` if neither applies (or if the
+    table is small enough for the cell-by-cell loop to be quicker).  ``masks``
+    are the :py:func:`match_masks` of ``seq1``, if they're already known (in
+    which case the elements of ``seq2`` must be hashable too)."""
+    m = len(seq1)
+    n = len(seq2)
+    if not opcodes and m * n <= SMALL_TABLE:
+        return None
+    if linear_space is None:
+        linear_space = m * n > LINEAR_SPACE_THRESHOLD
+    limit = diagonal_transition_limit(m, n, test, linear_space)
+    result = diagonal_transition(seq1, seq2, action_function, test, opcodes, limit)
+    if result is None:
+        result = bit_parallel(
+            seq1, seq2, action_function, test, opcodes, linear_space, masks
+        )
+    return result
+
+
+# pylint: disable-next=too-many-positional-arguments
+def diagonal_transition(seq1, seq2, action_function, test, opcodes=False, limit=None):
+    """Landau-Vishkin's diagonal transition algorithm for
+    :py:func:`lowest_cost_action`, which takes ``O((m + n) * d)`` time for a
+    distance of ``d``.  Returns ``(distance, matches, opcodes)``, or ``None``
+    if it isn't applicable or if the distance is more than ``limit`` (by
+    default, roughly where computing the whole table becomes cheaper).
+
+    For each number of edits ``e`` and each diagonal ``k = j - i`` we find the
+    furthest row ``i`` such that ``D[i][i + k] <= e``: it's the furthest row
+    reachable from the fronts for ``e - 1`` with one more edit, followed by a
+    slide along equal elements.  Distances never decrease along a diagonal,
+    so those fronts tell us whether any cell is within ``e`` edits, which is
+    enough to trace back the same path as :py:func:`lowest_cost_action`."""
+    if action_function is not lowest_cost_action or not seq1 or not seq2:
+        return None
+    m = len(seq1)
+    n = len(seq2)
+    if limit is None:
+        limit = diagonal_transition_limit(m, n, test)
+    target = n - m
+    # fronts[e][k + e] is the furthest row on diagonal k within e edits.
+    fronts: list = []
+    for e in range(limit + 1):
+        front = diagonal_front(seq1, seq2, test, fronts[-1] if fronts else None)
+        fronts.append(front)
+        if -e <= target <= e and front[target + e] >= m:
+            matches, ops = diagonal_traceback(seq1, seq2, test, fronts, opcodes)
+            return e, matches, ops
+    return None
+
+
+def diagonal_distance(seq1, seq2, test, limit):
+    """The distance alone with :py:func:`diagonal_transition`, keeping only
+    the last front, so in ``O(limit)`` memory.  Returns ``None`` if it's more
+    than ``limit``."""
+    m = len(seq1)
+    target = len(seq2) - m
+    front = None
+    for e in range(limit + 1):
+        front = diagonal_front(seq1, seq2, test, front)
+        if -e <= target <= e and front[target + e] >= m:
+            return e
+    return None
+
+
+# pylint: disable-next=too-many-branches
+def diagonal_front(seq1, seq2, test, prev):
+    """The fronts for one more edit than ``prev`` (or for no edits)."""
+    m = len(seq1)
+    n = len(seq2)
+    if prev is None:
+        row = 0
+        while row < m and row < n and test(seq1[row], seq2[row]):
+            row += 1
+        return [row]
+    unreached = -(m + n + 2)
+    e = len(prev) // 2 + 1
+    last = 2 * e
+    front = []
+    # front[i] is diagonal k = i - e, and prev[i - 1] is diagonal k in prev.
+    # Written out, as max() and min() are noticeably slower here.
+    # pylint: disable=consider-using-max-builtin,consider-using-min-builtin
+    for i in range(last + 1):
+        k = i - e
+        row = unreached
+        if 0 < i < last:  # substitution, along diagonal k
+            row = prev[i - 1] + 1
+        if i > 1:  # insertion, from diagonal k - 1
+            other = prev[i - 2]
+            if other > row:
+                row = other
+        if i < last - 1:  # deletion, from diagonal k + 1
+            other = prev[i] + 1
+            if other > row:
+                row = other
+        if row > m:
+            row = m
+        if row > n - k:
+            row = n - k
+        if row < 0 or row < -k:
+            row = unreached
+        else:
+            while row < m and row + k < n and test(seq1[row], seq2[row + k]):
+                row += 1
+        front.append(row)
+    return front
+
+
+def diagonal_transition_limit(m, n, test, linear_space=False):
+    """The number of edits up to which :py:func:`diagonal_transition` is
+    tried before falling back to computing whole columns.  The fronts for
+    ``d`` edits take ``O(d * d)`` memory, so in linear space mode the limit is
+    low enough to keep them within ``O(m + n)``."""
+    if test is operator.eq:
+        # against the bit-parallel engines: giving up costs a third or so of
+        # what they do
+        limit = math.isqrt(max(m, n))
+    else:
+        # against the cell-by-cell dynamic program
+        limit = max(4, min(m, n) // 4)
+    if linear_space:
+        limit = min(limit, max(4, math.isqrt(m + n)))
+    return limit
+
+
+def diagonal_distance_limit(m, n, test):
+    """The number of edits up to which :py:func:`diagonal_distance` is tried
+    before falling back to computing whole columns."""
+    if test is operator.eq:
+        # Giving up after d edits takes about as long as myers_distance on
+        # sequences of length 2 * d * d (or less time, on longer ones).
+        return math.isqrt(max(m, n) // 2)
+    return diagonal_transition_limit(m, n, test)
+
+
+def diagonal_traceback(seq1, seq2, test, fronts, opcodes):
+    """Trace back the :py:func:`lowest_cost_action` path through the fronts
+    found by :py:func:`diagonal_transition`.  Returns the number of matches
+    and the opcodes (or ``None`` if they weren't requested)."""
+
+    def within(e, i, j):
+        """Whether ``D[i][j] <= e``."""
+        return e >= 0 and -e <= j - i <= e and fronts[e][j - i + e] >= i
+
+    ops: list = []
+    matches = 0
+    i = len(seq1)
+    j = len(seq2)
+    d = len(fronts) - 1
+    while i and j:
+        # A match is always taken.  Otherwise each neighbour is at least
+        # d - 1, so we only need to know which ones are exactly that.
+        if test(seq1[i - 1], seq2[j - 1]):
+            matches += 1
+            action = EQUAL
+        else:
+            d -= 1
+            if within(d, i - 1, j - 1):
+                action = REPLACE
+            elif within(d, i, j - 1):
+                action = INSERT
+            else:
+                action = DELETE
+        if opcodes:
+            ops.append(opcode(action, i, j))
+        if action != INSERT:
+            i -= 1
+        if action != DELETE:
+            j -= 1
+    if not opcodes:
+        return matches, None
+    ops.extend(opcode(INSERT, 0, y) for y in range(j, 0, -1))
+    ops.extend(opcode(DELETE, x, 0) for x in range(i, 0, -1))
+    ops.reverse()
+    return matches, ops
+
+
+# pylint: disable-next=too-many-positional-arguments
+def bit_parallel(
+    seq1, seq2, action_function, test, opcodes=False, linear_space=None, masks=None
+):
+    """Compute ``(distance, matches, opcodes)`` with the bit-parallel engine
+    that matches ``action_function``.  Returns ``None`` if there isn't one, if
+    ``test`` isn't :py:func:`operator.eq`, or if the elements (of either
+    sequence) aren't hashable."""
+    if test is not operator.eq or not seq1 or not seq2:
+        return None
+    if action_function is lowest_cost_action:
+        engine = myers_engine
+    elif action_function is highest_match_action:
+        engine = lcs_engine
+    else:
+        return None
+    if masks is None:
+        masks = match_masks(seq1)
+        if masks is None or match_masks(seq2) is None:
+            return None
+    return align_columns(
+        len(seq1), len(seq2), engine(seq2, masks), opcodes, linear_space
+    )
+
+
+def myers_distance(seq1, seq2, masks=None):
+    """The edit distance alone with the Myers/Hyyrö bit-parallel algorithm
+    (see :py:func:`myers_engine`), keeping only the current column and the
+    distance in its last row.  Returns ``None`` if the elements aren't
+    hashable.  As in :py:func:`fast_alignment`, ``masks`` may be given."""
+    if masks is None:
+        masks = match_masks(seq1)
+        if masks is None or match_masks(seq2) is None:
+            return None
+    m = len(seq1)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp = full
+    vn = 0
+    dist = m
+    for b in seq2:
+        eq = masks.get(b, 0)
+        d0 = (((eq & vp) + vp) ^ vp) | eq | vn
+        hp = vn | (~(d0 | vp) & full)
+        hn = d0 & vp
+        if hp & last:
+            dist += 1
+        elif hn & last:
+            dist -= 1
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(d0 | hp) & full)
+        vn = hp & d0
+    return dist
+
+
+def distance_dp(seq1, seq2, test):
+    """The cell-by-cell dynamic program for the edit distance alone, with
+    just two columns of distances."""
+    n = len(seq2)
+    d0 = list(range(n + 1))
+    d1 = [0] * (n + 1)
+    for i in range(1, len(seq1) + 1):
+        a = seq1[i - 1]
+        d1[0] = i
+        for j in range(1, n + 1):
+            sub = d0[j - 1] if test(a, seq2[j - 1]) else d0[j - 1] + 1
+            ins = d1[j - 1] + 1
+            dele = d0[j] + 1
+            # Written out, as min() is noticeably slower here.
+            if ins < sub:
+                d1[j] = dele if dele < ins else ins
+            else:
+                d1[j] = dele if dele < sub else sub
+        d0, d1 = d1, d0
+    return d0[n]
+
+
+def match_masks(seq: Sequence) -> Optional[dict]:
+    """Map each distinct element of ``seq`` to an integer whose set bits are the
+    positions at which that element occurs.  Returns ``None`` if the elements
+    aren't hashable, or if one isn't equal to itself (like NaN): as a key, it
+    would still match itself."""
+    masks: dict = {}
+    bit = 1
+    try:
+        for x in seq:
+            masks[x] = masks.get(x, 0) | bit
+            bit <<= 1
+    except TypeError:
+        return None
+    if not all_self_equal(masks):
+        return None
+    return masks
+
+
+def all_self_equal(elements) -> bool:
+    """Whether each of the ``elements`` is equal to itself, so that looking it
+    up by hash compares it like :py:func:`operator.eq` would."""
+    # pylint: disable-next=comparison-with-itself
+    return all(x == x for x in elements)
+
+
+def trim_masks(masks: Optional[dict], start: int, stop: int) -> Optional[dict]:
+    """The :py:func:`match_masks` of ``seq[start:stop]``, given those of
+    ``seq`` (or ``None``)."""
+    if masks is None:
+        return None
+    full = (1 << (stop - start)) - 1
+    return {x: t for x, mask in masks.items() if (t := (mask >> start) & full)}
+
+
+def align_columns(m, n, engine, opcodes, linear_space):
+    """Compute the columns of the table from left to right and trace back the
+    best path from ``(m, n)``.  Returns ``(distance, matches, opcodes)``, where
+    the opcodes are ``None`` unless requested.
+
+    ``engine`` is a tuple ``(first, advance, traceback)``: ``first`` is the
+    state of column 0, ``advance(state, j, rows)`` computes column ``j``
+    (restricted to rows ``0..rows``) from column ``j - 1``, and
+    ``traceback(columns, c0, i, j, ops)`` follows the path from cell ``(i, j)``
+    back to column ``c0``, given the states of columns ``c0..j``.
+
+    Normally every column is kept.  In linear space mode (Hirschberg's divide
+    and conquer, splitting on columns) we compute up to the middle column,
+    solve the right half, and then solve the left half only up to the row at
+    which the path crossed the middle column.  The left half doesn't depend on
+    anything below that row, so it gets the same backpointers as the full
+    table.  Each level of the recursion holds on to the columns it starts
+    from and splits at, and a range of at most ``LINEAR_SPACE_BLOCK``
+    columns is solved with all of them kept.  So there are
+    ``O(log(n / LINEAR_SPACE_BLOCK))`` columns plus one block in memory at
+    a time."""
+    first, advance, traceback = engine
+    if linear_space is None:
+        linear_space = m * n > LINEAR_SPACE_THRESHOLD
+    block = LINEAR_SPACE_BLOCK if linear_space else n
+    ops: Optional[list] = [] if opcodes else None
+    totals = [0, 0]
+
+    def solve(c0, state, c1, i):
+        if c1 - c0 <= block:
+            columns = [state]
+            for j in range(c0 + 1, c1 + 1):
+                state = advance(state, j, i)
+                columns.append(state)
+            i, dist, matches = traceback(columns, c0, i, c1, ops)
+            totals[0] += dist
+            totals[1] += matches
+            return i
+        mid = (c0 + c1) // 2
+        mid_state = state
+        for j in range(c0 + 1, mid + 1):
+            mid_state = advance(mid_state, j, i)
+        return solve(c0, state, mid, solve(mid, mid_state, c1, i))
+
+    i = solve(0, first, n, m)
+    # Whatever is left of column 0 is deleted.
+    totals[0] += i
+    if ops is not None:
+        ops.extend(opcode(DELETE, x, 0) for x in range(i, 0, -1))
+        ops.reverse()
+    return totals[0], totals[1], ops
+
+
+def myers_engine(seq2, masks):
+    """Column functions for :py:func:`align_columns` implementing
+    :py:func:`lowest_cost_action` with the Myers/Hyyrö bit-parallel algorithm,
+    using Python integers as bit vectors over the positions of ``seq1``.
+
+    A column's state is ``(vp, vn, hp, hn)``: bit ``i - 1`` of ``vp``/``vn`` is
+    set when ``D[i][j] - D[i - 1][j]`` is +1/-1, and bit ``i - 1`` of ``hp``/``hn``
+    is set when ``D[i][j] - D[i][j - 1]`` is +1/-1."""
+
+    def advance(state, j, rows):
+        full = (1 << rows) - 1
+        vp = state[0] & full
+        vn = state[1] & full
+        eq = masks.get(seq2[j - 1], 0) & full
+        d0 = (((eq & vp) + vp) ^ vp) | eq | vn
+        hp = vn | (~(d0 | vp) & full)
+        hn = d0 & vp
+        # D[0][j] == j, so the horizontal delta shifted into row 0 is +1.
+        shp = ((hp << 1) | 1) & full
+        shn = (hn << 1) & full
+        return shn | (~(d0 | shp) & full), shp & d0, hp, hn
+
+    def traceback(columns, c0, i, j, ops):
+        # Ties are broken in favor of substitution, then insertion, then deletion.
+        vp, vn, _, _ = columns[j - c0]
+        low = (1 << i) - 1
+        d = j + popcount(vp & low) - popcount(vn & low)
+        dist = 0
+        matches = 0
+        while i and j > c0:
+            bit = 1 << (i - 1)
+            vp, vn, hp, hn = columns[j - c0]
+            if masks.get(seq2[j - 1], 0) & bit:
+                matches += 1
+                action = EQUAL
+            else:
+                dist += 1
+                # D[i][j - 1], then D[i - 1][j - 1] from the previous column
+                left = d - (1 if hp & bit else -1 if hn & bit else 0)
+                pvp, pvn, _, _ = columns[j - 1 - c0]
+                diag = left - (1 if pvp & bit else -1 if pvn & bit else 0)
+                if diag + 1 == d:
+                    action = REPLACE
+                    d = diag
+                elif left + 1 == d:
+                    action = INSERT
+                    d = left
+                else:
+                    action = DELETE
+                    d -= 1 if vp & bit else -1 if vn & bit else 0
+            if ops is not None:
+                ops.append(opcode(action, i, j))
+            if action != INSERT:
+                i -= 1
+            if action != DELETE:
+                j -= 1
+        return finish_row_zero(c0, i, j, dist, matches, ops)
+
+    # Column 0: D[i][0] == i, so every vertical delta is +1 (all bits set).
+    return (-1, 0, 0, 0), advance, traceback
+
+
+def lcs_engine(seq2, masks):
+    """Column functions for :py:func:`align_columns` implementing
+    :py:func:`highest_match_action` with the Allison-Dix/Hyyrö bit-parallel
+    longest common subsequence algorithm.
+
+    The match counts of that alignment are exactly the LCS table ``M``.  A
+    column's state has bit ``i - 1`` set when ``M[i][j] - M[i - 1][j]`` is 1, so
+    ``M[i][j]`` is the number of set bits below bit ``i``.  The distance depends
+    on how ties are broken, so it's counted while tracing back."""
+
+    def advance(state, j, rows):
+        full = (1 << rows) - 1
+        v = ~state & full
+        u = v & masks.get(seq2[j - 1], 0)
+        return ~((v + u) | (v - u)) & full
+
+    def traceback(columns, c0, i, j, ops):
+        # M[i][j] only changes when we step back over a match.
+        here = popcount(columns[j - c0] & ((1 << i) - 1))
+        dist = 0
+        matches = 0
+        while i and j > c0:
+            bit = 1 << (i - 1)
+            if masks.get(seq2[j - 1], 0) & bit:
+                action = EQUAL
+                matches += 1
+                here -= 1
+            else:
+                dist += 1
+                prev = columns[j - 1 - c0]
+                diag = popcount(prev & (bit - 1))
+                left = diag + 1 if prev & bit else diag
+                if diag == here:
+                    action = REPLACE
+                elif left == here:
+                    action = INSERT
+                else:
+                    action = DELETE
+            if ops is not None:
+                ops.append(opcode(action, i, j))
+            if action != INSERT:
+                i -= 1
+            if action != DELETE:
+                j -= 1
+        return finish_row_zero(c0, i, j, dist, matches, ops)
+
+    # Column 0: M[i][0] == 0
+    return 0, advance, traceback
+
+
+def dp_engine(seq1, seq2, action_function, test):
+    """Column functions for :py:func:`align_columns` that fill in the table
+    cell by cell with ``action_function``, like
+    :py:func:`~edit_distance.edit_distance_backpointer`.  A column's state is
+    its list of distances and its list of match counts.  The built-in action
+    functions are written out in the loop (see :py:func:`lowest_cost_column`)."""
+
+    def advance(state, j, rows):
+        d0, m0 = state
+        d1 = [j] * (rows + 1)
+        m1 = [0] * (rows + 1)
+        b = seq2[j - 1]
+        for i in range(1, rows + 1):
+            cost = 0 if test(seq1[i - 1], b) else 1
+            action = action_function(
+                d0[i] + 1,
+                d1[i - 1] + 1,
+                d0[i - 1] + cost,
+                m0[i],
+                m1[i - 1],
+                m0[i - 1] + int(not cost),
+                cost,
+            )
+            if action in [EQUAL, REPLACE]:
+                d1[i] = d0[i - 1] + cost
+                m1[i] = m0[i - 1] + int(not cost)
+            elif action == INSERT:
+                d1[i] = d0[i] + 1
+                m1[i] = m0[i]
+            elif action == DELETE:
+                d1[i] = d1[i - 1] + 1
+                m1[i] = m1[i - 1]
+            else:
+                raise Exception("Invalid dynamic programming action returned!")
+        return d1, m1
+
+    def traceback(columns, c0, i, j, ops):
+        dist = 0
+        matches = 0
+        while i and j > c0:
+            d0, m0 = columns[j - 1 - c0]
+            d1, m1 = columns[j - c0]
+            cost = 0 if test(seq1[i - 1], seq2[j - 1]) else 1
+            action = action_function(
+                d0[i] + 1,
+                d1[i - 1] + 1,
+                d0[i - 1] + cost,
+                m0[i],
+                m1[i - 1],
+                m0[i - 1] + int(not cost),
+                cost,
+            )
+            if ops is not None:
+                ops.append(opcode(action, i, j))
+            if action in [EQUAL, REPLACE]:
+                dist += cost
+                matches += 1 - cost
+                i -= 1
+                j -= 1
+            elif action == INSERT:
+                dist += 1
+                j -= 1
+            else:
+                dist += 1
+                i -= 1
+        return finish_row_zero(c0, i, j, dist, matches, ops)
+
+    if action_function is lowest_cost_action:
+
+        def advance(state, j, rows):  # pylint: disable=function-redefined
+            return lowest_cost_column(seq1, seq2[j - 1], test, state, j, rows)
+
+    elif action_function is highest_match_action:
+
+        def advance(state, j, rows):  # pylint: disable=function-redefined
+            return highest_match_column(seq1, seq2[j - 1], test, state, j, rows)
+
+    m = len(seq1)
+    return (list(range(m + 1)), [0] * (m + 1)), advance, traceback
+
+
+# pylint: disable-next=too-many-positional-arguments
+def lowest_cost_column(seq1, b, test, state, j, rows):
+    """Column ``j`` of the table (restricted to rows ``0..rows``) from the
+    state ``(distances, matches)`` of column ``j - 1``, as
+    :py:func:`lowest_cost_action` would fill it in, where ``b`` is the element
+    of ``seq2`` for this column."""
+    d0, m0 = state
+    d1 = [j] * (rows + 1)
+    m1 = [0] * (rows + 1)
+    for i in range(1, rows + 1):
+        if test(seq1[i - 1], b):
+            sub_cost = d0[i - 1]
+            sub_match = m0[i - 1] + 1
+        else:
+            sub_cost = d0[i - 1] + 1
+            sub_match = m0[i - 1]
+        ins_cost = d0[i] + 1
+        del_cost = d1[i - 1] + 1
+        # Ties go to substitution, then insertion, then deletion.
+        if sub_cost <= ins_cost and sub_cost <= del_cost:
+            d1[i] = sub_cost
+            m1[i] = sub_match
+        elif ins_cost <= del_cost:
+            d1[i] = ins_cost
+            m1[i] = m0[i]
+        else:
+            d1[i] = del_cost
+            m1[i] = m1[i - 1]
+    return d1, m1
+
+
+# pylint: disable-next=too-many-positional-arguments
+def highest_match_column(seq1, b, test, state, j, rows):
+    """Same as :py:func:`lowest_cost_column`, for
+    :py:func:`highest_match_action`."""
+    d0, m0 = state
+    d1 = [j] * (rows + 1)
+    m1 = [0] * (rows + 1)
+    for i in range(1, rows + 1):
+        if test(seq1[i - 1], b):
+            sub_cost = d0[i - 1]
+            sub_match = m0[i - 1] + 1
+        else:
+            sub_cost = d0[i - 1] + 1
+            sub_match = m0[i - 1]
+        ins_match = m0[i]
+        del_match = m1[i - 1]
+        # Ties go to substitution, then insertion, then deletion.
+        if sub_match >= ins_match and sub_match >= del_match:
+            d1[i] = sub_cost
+            m1[i] = sub_match
+        elif ins_match >= del_match:
+            d1[i] = d0[i] + 1
+            m1[i] = ins_match
+        else:
+            d1[i] = d1[i - 1] + 1
+            m1[i] = del_match
+    return d1, m1
+
+
+def inline_dp(seq1, seq2, action_function, test, opcodes=False):
+    """The cell-by-cell dynamic program with the choice made by
+    :py:func:`lowest_cost_action` or :py:func:`highest_match_action` written
+    out in the loop, rather than calling ``action_function`` for every cell.
+    Returns ``(distance, matches, opcodes)`` (the latter ``None`` unless
+    requested), or ``None`` for any other action function."""
+    if action_function is lowest_cost_action:
+        kernel = lowest_cost_row
+    elif action_function is highest_match_action:
+        kernel = highest_match_row
+    else:
+        return None
+    m = len(seq1)
+    n = len(seq2)
+    d0 = list(range(n + 1))
+    d1 = [0] * (n + 1)
+    m0 = [0] * (n + 1)
+    m1 = [0] * (n + 1)
+    bp: Optional[BackpointerTable] = None
+    if opcodes:
+        bp = BackpointerTable(n + 1)
+        bp.append(bytearray([INSERT_CODE]) * (n + 1))
+    for i in range(1, m + 1):
+        d1[0] = i
+        row = None
+        if bp is not None:
+            row = bytearray([DELETE_CODE]) * (n + 1)
+        kernel(seq1[i - 1], seq2, test, d0, d1, m0, m1, row)
+        if bp is not None:
+            bp.append(row)
+        d0, d1 = d1, d0
+        m0, m1 = m1, m0
+    if bp is None:
+        return d0[n], m0[n], None
+    return d0[n], m0[n], trace_backpointers(bp.action, m, n)
+
+
+# pylint: disable-next=too-many-positional-arguments
+def lowest_cost_row(a, seq2, test, d0, d1, m0, m1, row):
+    """Fill in row ``d1``/``m1`` of the table from row ``d0``/``m0`` as
+    :py:func:`lowest_cost_action` would, where ``a`` is the element of
+    ``seq1`` for this row.  The action codes (see :py:class:`BackpointerTable`)
+    go in ``row``, if it isn't ``None``."""
+    for j in range(1, len(seq2) + 1):
+        if test(a, seq2[j - 1]):
+            sub_cost = d0[j - 1]
+            sub_match = m0[j - 1] + 1
+            action = EQUAL_CODE
+        else:
+            sub_cost = d0[j - 1] + 1
+            sub_match = m0[j - 1]
+            action = REPLACE_CODE
+        ins_cost = d1[j - 1] + 1
+        del_cost = d0[j] + 1
+        # Ties go to substitution, then insertion, then deletion.
+        if sub_cost <= ins_cost and sub_cost <= del_cost:
+            d1[j] = sub_cost
+            m1[j] = sub_match
+        elif ins_cost <= del_cost:
+            d1[j] = ins_cost
+            m1[j] = m1[j - 1]
+            action = INSERT_CODE
+        else:
+            d1[j] = del_cost
+            m1[j] = m0[j]
+            action = DELETE_CODE
+        if row is not None:
+            row[j] = action
+
+
+# pylint: disable-next=too-many-positional-arguments
+def highest_match_row(a, seq2, test, d0, d1, m0, m1, row):
+    """Same as :py:func:`lowest_cost_row`, for :py:func:`highest_match_action`."""
+    for j in range(1, len(seq2) + 1):
+        if test(a, seq2[j - 1]):
+            sub_cost = d0[j - 1]
+            sub_match = m0[j - 1] + 1
+            action = EQUAL_CODE
+        else:
+            sub_cost = d0[j - 1] + 1
+            sub_match = m0[j - 1]
+            action = REPLACE_CODE
+        ins_match = m1[j - 1]
+        del_match = m0[j]
+        # Ties go to substitution, then insertion, then deletion.
+        if sub_match >= ins_match and sub_match >= del_match:
+            d1[j] = sub_cost
+            m1[j] = sub_match
+        elif ins_match >= del_match:
+            d1[j] = d1[j - 1] + 1
+            m1[j] = ins_match
+            action = INSERT_CODE
+        else:
+            d1[j] = d0[j] + 1
+            m1[j] = del_match
+            action = DELETE_CODE
+        if row is not None:
+            row[j] = action
+
+
+# pylint: disable-next=too-many-positional-arguments
+def finish_row_zero(c0, i, j, dist, matches, ops):
+    """End of an :py:func:`align_columns` traceback: once the path reaches row
+    0 it inserts its way back to column ``c0``."""
+    if ops is not None:
+        ops.extend(opcode(INSERT, 0, y) for y in range(j, c0, -1))
+    return i, dist + j - c0, matches
+
+
+# Above this many cells, edit_distance_backpointer switches to linear space.
+LINEAR_SPACE_THRESHOLD = 1 << 24
+# The number of columns that linear space mode keeps at a time.
+LINEAR_SPACE_BLOCK = 32
+# Up to this length, levenshtein goes straight to the bit-parallel engine,
+# which is quicker than trying the diagonal transition first (unless
+# max_distance is small enough to stop it early).
+SHORT_SEQUENCE = 64
+# Up to this many cells, the cell-by-cell loop finds the distance and matches
+# quicker than the other engines are set up.
+SMALL_TABLE = 25
+
+
+def popcount(x: int) -> int:
+    """Number of set bits in a non-negative integer."""
+    return bin(x).count("1")
+
+
+def opcode(action, i, j):
+    """The opcode for taking ``action`` into cell ``(i, j)`` of the table."""
+    if action == INSERT:
+        return [INSERT, i, i, j - 1, j]
+    if action == DELETE:
+        return [DELETE, i - 1, i, j, j]
+    return [action, i - 1, i, j - 1, j]
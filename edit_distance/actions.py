@@ -0,0 +1,81 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The edit actions (opcode tags), and the functions that choose between them
+while filling in the dynamic programming table.
+"""
+
+INSERT: str = "insert"
+DELETE: str = "delete"
+EQUAL: str = "equal"
+REPLACE: str = "replace"
+
+
+# Cost is basically: was there a match or not.
+# The other numbers are cumulative costs and matches.
+
+
+# pylint: disable-next=too-many-positional-arguments
+def lowest_cost_action(ic, dc, sc, im, dm, sm, cost) -> str:
+    """Given the following values, choose the action (insertion, deletion,
+    or substitution), that results in the lowest cost (ties are broken in
+    favor of substitution, then insertion, then deletion).  This is used
+    within the dynamic programming algorithm.
+
+    * ic - insertion cost
+
+    * dc - deletion cost
+
+    * sc - substitution cost
+
+    * im - insertion match (score)
+
+    * dm - deletion match (score)
+
+    * sm - substitution match (score)
+    """
+    min_cost = min(ic, dc, sc)
+    if min_cost == sc:
+        return EQUAL if cost == 0 else REPLACE
+    if min_cost == ic:
+        return INSERT
+    return DELETE
+
+
+# pylint: disable-next=too-many-positional-arguments
+def highest_match_action(ic, dc, sc, im, dm, sm, cost) -> str:
+    """Given the following values, choose the action (insertion, deletion, or
+    substitution), that results in the highest match score (ties are broken in
+    favor of substitution, then insertion, then deletion).  This is used
+    within the dynamic programming algorithm.
+
+    * ic - insertion cost
+
+    * dc - deletion cost
+
+    * sc - substitution cost
+
+    * im - insertion match (score)
+
+    * dm - deletion match (score)
+
+    * sm - substitution match (score)
+    """
+    max_match = max(im, dm, sm)
+    if max_match == sm:
+        return EQUAL if cost == 0 else REPLACE
+    if max_match == im:
+        return INSERT
+    return DELETE
@@ -0,0 +1,147 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Levenshtein automata: testing many candidates against a query for being
+within a fixed edit distance of it.
+"""
+
+from collections.abc import Sequence
+from typing import Optional
+
+from edit_distance import _engines
+
+
+class LevenshteinAutomaton:
+    """
+    A deterministic automaton that accepts the sequences within
+    ``max_distance`` edits of ``query``, that is those for which
+    ``edit_distance(query, seq)[0] <= max_distance``.
+
+    A state of the automaton is a column of the dynamic programming table
+    (one distance per position of ``query``), with every distance above
+    ``max_distance`` replaced by ``max_distance + 1``: a distance that high can
+    never come back down, so the decision is the same.  The next column only
+    depends on the positions of ``query`` at which the next element occurs, so
+    the transitions are cached by state and by those positions (which are the
+    same for every element that isn't in ``query``).  The states are built as
+    they're reached, and once the automaton has seen a few candidates, most
+    steps are two dictionary lookups.  The elements must be hashable.
+    """
+
+    # The id of the start state
+    start = 0
+
+    def __init__(self, query: Sequence, max_distance: int):
+        """Initialize the automaton for ``query``; see
+        :py:func:`build_automaton`."""
+        if max_distance < 0:
+            raise ValueError("max_distance must be non-negative")
+        masks = _engines.match_masks(query)
+        if masks is None:
+            raise TypeError("The elements of the query must be hashable")
+        self.query = query
+        self.max_distance = max_distance
+        self._masks = masks
+        # The states, by id: their columns, and their transitions by mask
+        self._ids: dict = {}
+        self._columns: list = []
+        self._transitions: list = []
+        self._state(tuple(min(i, max_distance + 1) for i in range(len(query) + 1)))
+        # The state whose distances are all too high, from which nothing is
+        # accepted
+        self._dead = self._state((max_distance + 1,) * (len(query) + 1))
+
+    def _state(self, column: tuple) -> int:
+        """The id of the state for ``column``, adding it if it's new."""
+        state = self._ids.get(column)
+        if state is None:
+            state = self._ids[column] = len(self._columns)
+            self._columns.append(column)
+            self._transitions.append({})
+        return state
+
+    def _step(self, state: int, mask: int) -> int:
+        """The state after an element that occurs at the positions of the
+        query given by ``mask``."""
+        d0 = self._columns[state]
+        cap = self.max_distance + 1
+        # d0[0] counts the elements so far, up to the cap.
+        d1 = [min(d0[0] + 1, cap)]
+        for i in range(1, len(d0)):
+            cost = d0[i - 1] if mask >> (i - 1) & 1 else d0[i - 1] + 1
+            cost = min(cost, d0[i] + 1, d1[i - 1] + 1, cap)
+            d1.append(cost)
+        if min(d1) == cap:
+            following = self._dead
+        else:
+            following = self._state(tuple(d1))
+        self._transitions[state][mask] = following
+        return following
+
+    def _run(self, seq: Sequence) -> int:
+        """The state reached after ``seq``."""
+        masks = self._masks
+        transitions = self._transitions
+        dead = self._dead
+        state = self.start
+        for x in seq:
+            mask = masks.get(x, 0)
+            following = transitions[state].get(mask)
+            if following is None:
+                following = self._step(state, mask)
+            if following == dead:
+                return dead
+            state = following
+        return state
+
+    def step(self, state: int, x) -> Optional[int]:
+        """The state after element ``x`` from ``state`` (the start state is
+        :py:attr:`start`), or ``None`` if no sequence with this prefix can be
+        accepted.  This is for walking the automaton alongside, for example,
+        a trie of candidates."""
+        mask = self._masks.get(x, 0)
+        following = self._transitions[state].get(mask)
+        if following is None:
+            following = self._step(state, mask)
+        return None if following == self._dead else following
+
+    def state_distance(self, state: int) -> int:
+        """The distance (as :py:meth:`distance` gives it) of the sequence
+        that led to ``state``."""
+        return self._columns[state][-1]
+
+    def accepts(self, seq: Sequence) -> bool:
+        """Whether ``seq`` is within ``max_distance`` edits of the query."""
+        return self._columns[self._run(seq)][-1] <= self.max_distance
+
+    def distance(self, seq: Sequence) -> int:
+        """The edit distance between the query and ``seq``, or
+        ``max_distance + 1`` if it's greater than ``max_distance`` (like
+        :py:func:`~edit_distance.levenshtein`)."""
+        return self._columns[self._run(seq)][-1]
+
+    def __len__(self) -> int:
+        """The number of states built so far."""
+        return len(self._columns)
+
+
+def build_automaton(query: Sequence, max_distance: int) -> LevenshteinAutomaton:
+    """
+    Builds a :py:class:`LevenshteinAutomaton` that accepts the sequences within
+    ``max_distance`` edits of ``query``.  Testing a candidate takes
+    ``O(len(candidate))`` steps of the automaton, rather than filling in a
+    table, so this suits testing one query against a whole lexicon.
+    """
+    return LevenshteinAutomaton(query, max_distance)
@@ -0,0 +1,141 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A BK-tree: a metric index of sequences under the edit distance.
+"""
+
+import heapq
+from collections.abc import Iterable, Sequence
+from typing import Optional
+
+from edit_distance.edit_distance import levenshtein
+from edit_distance.interning import Interner
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree of sequences, for finding the stored sequences
+    near a query without computing the edit distance to each of them.
+
+    Each node holds a sequence, and its children are keyed by their edit
+    distance to it.  The edit distance is a metric, so by the triangle
+    inequality, the sequences within ``r`` edits of a query that is ``d``
+    edits from a node can only be under the children with keys from ``d - r``
+    to ``d + r``.  The other subtrees are skipped, usually most of them.
+    Distances are computed with :py:func:`~edit_distance.levenshtein`, cut off
+    as soon as they're too high to matter.  That is still well above ``r`` at
+    nodes with distant children, so for long sequences that are mostly far
+    apart, checking every sequence with ``max_distance=r`` can be quicker, and
+    a :py:class:`~edit_distance.QGramIndex` much quicker.
+
+    The sequences are interned with ``interner`` (or a new
+    :py:class:`~edit_distance.Interner`) as they're added, so their elements
+    must be hashable.  Queries don't add to the vocabulary.  Adding a sequence
+    that is already in the tree does nothing.
+    """
+
+    def __init__(self, items: Iterable = (), interner: Optional[Interner] = None):
+        """Initialize the tree, optionally with some ``items``."""
+        self.interner = interner if interner is not None else Interner()
+        # A node is [sequence, its codes, children by distance].
+        self._root: Optional[list] = None
+        self._count = 0
+        for item in items:
+            self.add(item)
+
+    def add(self, seq: Sequence):
+        """Add ``seq`` to the tree."""
+        codes = self.interner.intern(seq)
+        if self._root is None:
+            self._root = [seq, codes, {}]
+            self._count = 1
+            return
+        node = self._root
+        while True:
+            dist = levenshtein(node[1], codes)
+            if dist == 0:
+                return
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = [seq, codes, {}]
+                self._count += 1
+                return
+            node = child
+
+    def _encode(self, seq: Sequence) -> list:
+        # Elements that aren't in the vocabulary can't match any stored
+        # element, so they all get code -1 (and the vocabulary is unchanged).
+        codes = self.interner.codes
+        return [codes.get(x, -1) for x in seq]
+
+    def range_query(self, seq: Sequence, max_distance: int) -> list:
+        """Returns the ``(item, distance)`` of the stored sequences within
+        ``max_distance`` edits of ``seq``, sorted by distance."""
+        codes = self._encode(seq)
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            item, item_codes, children = stack.pop()
+            # Beyond this, neither the node nor any child can be in range.
+            limit = max_distance + max(children, default=0)
+            dist = levenshtein(codes, item_codes, max_distance=limit)
+            if dist <= max_distance:
+                results.append((item, dist))
+            for key, child in children.items():
+                if dist - max_distance <= key <= dist + max_distance:
+                    stack.append(child)
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def nearest(self, seq: Sequence, k: int = 1) -> list:
+        """
+        Returns the ``(item, distance)`` of the ``k`` stored sequences closest
+        to ``seq`` (or of all of them, if there are fewer), sorted by
+        distance.  Ties for the last place are broken arbitrarily.
+
+        The nodes are visited in order of the lower bound that the triangle
+        inequality gives on the distances under them, and the search stops
+        once that bound reaches the ``k``-th best distance so far.
+        """
+        codes = self._encode(seq)
+        if k <= 0 or self._root is None:
+            return []
+        # The best results so far, as a max-heap on (distance, order found)
+        best: list = []
+        # Nodes to visit, as a min-heap on (lower bound, order added)
+        queue = [(0, 0, self._root)]
+        added = 1
+        while queue:
+            bound, order, node = heapq.heappop(queue)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            item, item_codes, children = node
+            limit = None
+            if len(best) == k:
+                limit = -best[0][0] + max(children, default=0)
+            dist = levenshtein(codes, item_codes, max_distance=limit)
+            if len(best) < k:
+                heapq.heappush(best, (-dist, -order, item))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, -order, item))
+            for key, child in children.items():
+                bound = abs(dist - key)
+                if len(best) < k or bound < -best[0][0]:
+                    heapq.heappush(queue, (bound, added, child))
+                    added += 1
+        return [(item, -dist) for dist, _, item in sorted(best, reverse=True)]
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,126 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A deletion neighbourhood (SymSpell) index, for finding the entries of a
+vocabulary within a small edit distance of a query.
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Optional
+
+from edit_distance.edit_distance import levenshtein
+
+
+class DeletionIndex:
+    """
+    An index of sequences (the entries) by the variants of their prefixes with
+    up to ``max_distance`` elements deleted.
+
+    If two sequences are within ``k`` edits of each other, deleting at most
+    ``k`` elements from each of their first ``prefix_length`` elements can
+    give the same sequence.  So :py:meth:`search` only has to look up the
+    deletion variants of the query's prefix, and compute the edit distance
+    (with :py:func:`~edit_distance.levenshtein`, cut off at the search's
+    ``max_distance``) to the few entries that share one.  For small distances
+    this is a handful of dictionary lookups, however large the vocabulary.
+
+    The number of variants of an entry grows with ``prefix_length`` to the
+    power of ``max_distance``, so the prefix bounds the size of the index
+    (``None`` indexes whole entries).  With ``hashes_only``, only the hashes of
+    the variants are kept rather than the variants themselves, which takes
+    much less memory; a collision just gives an extra candidate to check.
+    The elements of the entries must be hashable.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable = (),
+        max_distance: int = 2,
+        prefix_length: Optional[int] = 7,
+        hashes_only: bool = False,
+    ):
+        """Initialize the index, optionally with some ``entries``."""
+        if max_distance < 0:
+            raise ValueError("max_distance must be non-negative")
+        if prefix_length is not None and prefix_length <= max_distance:
+            raise ValueError("prefix_length must be greater than max_distance")
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.hashes_only = hashes_only
+        self.entries: list = []
+        # The entries by variant (or hash), as an index into entries, or a
+        # list of them when there are several (most variants have just one).
+        self._index: dict = {}
+        for entry in entries:
+            self.add(entry)
+
+    def _variants(self, seq: Sequence, max_distance: int) -> set:
+        """The keys of the variants of the prefix of ``seq`` with up to
+        ``max_distance`` elements deleted."""
+        frontier = {tuple(seq[: self.prefix_length])}
+        variants = set(frontier)
+        for _ in range(max_distance):
+            frontier = {v[:i] + v[i + 1 :] for v in frontier for i in range(len(v))}
+            variants |= frontier
+        if self.hashes_only:
+            return {hash(variant) for variant in variants}
+        return variants
+
+    def add(self, entry: Sequence):
+        """Add ``entry`` to the index."""
+        index = self._index
+        number = len(self.entries)
+        self.entries.append(entry)
+        for key in self._variants(entry, self.max_distance):
+            found = index.get(key)
+            if found is None:
+                index[key] = number
+            elif isinstance(found, int):
+                index[key] = [found, number]
+            else:
+                found.append(number)
+
+    def search(self, query: Sequence, max_distance: Optional[int] = None) -> list:
+        """
+        Returns the ``(entry, distance)`` of the entries within
+        ``max_distance`` edits of ``query``, sorted by distance (then in the
+        order they were added).  ``max_distance`` defaults to, and can't be
+        greater than, the one the index was built for.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(
+                f"The index only supports distances up to {self.max_distance}"
+            )
+        index = self._index
+        candidates = set()
+        for key in self._variants(query, max_distance):
+            found = index.get(key)
+            if isinstance(found, int):
+                candidates.add(found)
+            elif found is not None:
+                candidates.update(found)
+        results = []
+        for number in sorted(candidates):
+            entry = self.entries[number]
+            dist = levenshtein(query, entry, max_distance=max_distance)
+            if dist <= max_distance:
+                results.append((entry, dist))
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def __len__(self) -> int:
+        return len(self.entries)
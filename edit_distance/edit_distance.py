@@ -23,87 +23,174 @@ import sys
 from collections.abc import Sequence
 from typing import Optional
 
-INSERT: str = "insert"
-DELETE: str = "delete"
-EQUAL: str = "equal"
-REPLACE: str = "replace"
-
-
-# Cost is basically: was there a match or not.
-# The other numbers are cumulative costs and matches.
-
-
-# pylint: disable-next=too-many-positional-arguments
-def lowest_cost_action(ic, dc, sc, im, dm, sm, cost) -> str:
-    """Given the following values, choose the action (insertion, deletion,
-    or substitution), that results in the lowest cost (ties are broken in
-    favor of substitution, then insertion, then deletion).  This is used
-    within the dynamic programming algorithm.
-
-    * ic - insertion cost
-
-    * dc - deletion cost
-
-    * sc - substitution cost
-
-    * im - insertion match (score)
-
-    * dm - deletion match (score)
-
-    * sm - substitution match (score)
+from edit_distance import _engines
+
+# The actions are re-exported from here, as they were defined here originally.
+from edit_distance.actions import (  # pylint: disable=unused-import
+    DELETE,
+    EQUAL,
+    INSERT,
+    REPLACE,
+    highest_match_action,
+    lowest_cost_action,
+)
+from edit_distance.interning import Interner
+
+
+# pylint: disable-next=too-many-instance-attributes
+class CompiledPattern:
+    """
+    A sequence prepared for being compared against many others, as ``seq1``.
+    Whatever only depends on ``seq1`` is done once: with
+    :py:func:`operator.eq` as the test, its elements are mapped to integer
+    codes (each element of a ``seq2`` then needs a single dictionary lookup,
+    and elements that aren't in ``seq1`` at all get the code ``-1``) and the
+    bit masks of the positions of each code are computed.  Use
+    :py:func:`~edit_distance.compile_pattern` to create one.
     """
-    min_cost = min(ic, dc, sc)
-    if min_cost == sc:
-        return EQUAL if cost == 0 else REPLACE
-    if min_cost == ic:
-        return INSERT
-    return DELETE
-
-
-# pylint: disable-next=too-many-positional-arguments
-def highest_match_action(ic, dc, sc, im, dm, sm, cost) -> str:
-    """Given the following values, choose the action (insertion, deletion, or
-    substitution), that results in the highest match score (ties are broken in
-    favor of substitution, then insertion, then deletion).  This is used
-    within the dynamic programming algorithm.
-
-    * ic - insertion cost
-
-    * dc - deletion cost
-
-    * sc - substitution cost
 
-    * im - insertion match (score)
+    def __init__(
+        self,
+        seq1: Sequence,
+        test=operator.eq,
+        action_function=lowest_cost_action,
+        interner: Optional[Interner] = None,
+    ):
+        """Prepare ``seq1`` for comparisons with ``test`` and
+        ``action_function``, optionally interning with ``interner`` rather
+        than a vocabulary of its own."""
+        self.seq1 = seq1
+        self.test = test
+        self.action_function = action_function
+        self.interner = interner
+        self.length = len(seq1)
+        self.vocabulary: Optional[dict] = None
+        self.codes: Sequence = seq1
+        self.masks: Optional[dict] = None
+        if interner is not None:
+            try:
+                self.codes = _intern(interner, seq1, [], test)[0]
+            except TypeError:
+                pass
+        elif test is operator.eq:
+            vocabulary: dict = {}
+            try:
+                codes = [vocabulary.setdefault(x, len(vocabulary)) for x in seq1]
+                if _engines.all_self_equal(vocabulary):
+                    self.codes = codes
+                    self.vocabulary = vocabulary
+            except TypeError:
+                pass
+        if self.codes is not seq1:
+            self.masks = _engines.match_masks(self.codes)
+
+    def encode(self, seq2: Sequence):
+        """The two sequences that are actually compared (the codes, if the
+        elements of both are hashable), and the masks of the first one."""
+        if self.codes is not self.seq1:
+            try:
+                if self.interner is not None:
+                    codes = self.interner.intern(seq2)
+                else:
+                    vocabulary: dict = self.vocabulary or {}
+                    codes = [vocabulary.get(x, -1) for x in seq2]
+                return self.codes, codes, self.masks
+            except TypeError:
+                pass
+        return self.seq1, seq2, None
+
+    def edit_distance(self, seq2: Sequence, max_distance: Optional[int] = None):
+        """Same as :py:func:`~edit_distance.edit_distance` between the pattern
+        and ``seq2``."""
+        a, b, masks = self.encode(seq2)
+        return _edit_distance(
+            a, b, self.action_function, self.test, max_distance, masks
+        )
 
-    * dm - deletion match (score)
+    def edit_distance_backpointer(
+        self,
+        seq2: Sequence,
+        max_distance: Optional[int] = None,
+        linear_space: Optional[bool] = None,
+    ):
+        """Same as :py:func:`~edit_distance.edit_distance_backpointer` between
+        the pattern and ``seq2``."""
+        a, b, masks = self.encode(seq2)
+        return _edit_distance_backpointer(
+            a, b, self.action_function, self.test, max_distance, linear_space, masks
+        )
 
-    * sm - substitution match (score)
+    def distance(self, seq2: Sequence, max_distance: Optional[int] = None) -> int:
+        """The edit distance between the pattern and ``seq2`` (or
+        ``max_distance + 1`` if it's greater than ``max_distance``)."""
+        if self.action_function is lowest_cost_action:
+            a, b, masks = self.encode(seq2)
+            return _levenshtein(a, b, self.test, max_distance, masks)
+        return self.edit_distance(seq2, max_distance)[0]
+
+    def matches(self, seq2: Sequence) -> int:
+        """The number of matches in the alignment of the pattern and ``seq2``."""
+        return self.edit_distance(seq2)[1]
+
+    def opcodes(self, seq2: Sequence) -> list:
+        """The opcodes turning the pattern into ``seq2``."""
+        return self.edit_distance_backpointer(seq2)[2]
+
+
+def compile_pattern(
+    seq1: Sequence,
+    test=operator.eq,
+    action_function=lowest_cost_action,
+    interner: Optional[Interner] = None,
+) -> CompiledPattern:
     """
-    max_match = max(im, dm, sm)
-    if max_match == sm:
-        return EQUAL if cost == 0 else REPLACE
-    if max_match == im:
-        return INSERT
-    return DELETE
+    Prepare ``seq1`` for being compared against many sequences, like
+    :py:mod:`difflib`'s :py:class:`~difflib.SequenceMatcher` does with its
+    second sequence.  The returned :py:class:`CompiledPattern` has
+    :py:meth:`~CompiledPattern.distance`, :py:meth:`~CompiledPattern.matches`
+    and :py:meth:`~CompiledPattern.opcodes` methods, which take the other
+    sequence and give the same results as
+    :py:func:`~edit_distance.edit_distance` and
+    :py:func:`~edit_distance.edit_distance_backpointer` would.
+    """
+    return CompiledPattern(seq1, test, action_function, interner)
 
 
+# pylint: disable-next=too-many-instance-attributes
 class SequenceMatcher:
     """
     Similar to the :py:mod:`difflib` :py:class:`~difflib.SequenceMatcher`, but
     uses Levenshtein/edit distance.
     """
 
+    # pylint: disable-next=too-many-positional-arguments
     def __init__(
         self,
         a: Optional[Sequence] = None,
         b: Optional[Sequence] = None,
         test=operator.eq,
         action_function=lowest_cost_action,
+        interner: Optional[Interner] = None,
+        single_pass: Optional[bool] = None,
     ):
         """
         Initialize the object with sequences a and b.  Optionally, one can
         specify a test function that is used to compare sequence elements. This
         defaults to the built in ``eq`` operator (i.e. :py:func:`operator.eq`).
+        An :py:class:`~edit_distance.Interner` can be given to share a
+        vocabulary between many comparisons, and then the codes of b are also
+        kept while a is replaced.  Otherwise, with :py:func:`operator.eq`, the
+        elements of b are looked up in a vocabulary of a's elements (see
+        :py:func:`~edit_distance.compile_pattern`), which is replaced along
+        with a.
+
+        If ``single_pass`` is true, the opcodes are always computed along with
+        the distance and the number of matches, so that asking for all three
+        only takes one pass over the table.  If it's false, they're only
+        computed when :py:meth:`get_opcodes` is called.  By default, they are
+        once :py:meth:`get_opcodes` has been called for any pair of sequences,
+        and likewise :py:meth:`distance` computes the number of matches once
+        :py:meth:`matches` has been called.
         """
         if a is None:
             a = []
@@ -114,6 +201,15 @@ class SequenceMatcher:
         self._reset_object()
         self.action_function = action_function
         self.test = test
+        self.interner = interner
+        self.single_pass = single_pass
+        # What has been asked for so far, to guess what will be next
+        self._opcodes_wanted = False
+        self._matches_wanted = False
+        # Whatever only depends on one of the sequences is kept until it
+        # changes: seq1 compiled, and the codes of seq2.
+        self._pattern: Optional[CompiledPattern] = None
+        self._codes2: Optional[tuple] = None
         self.dist = None
         self._matches = None
         self.opcodes = None
@@ -131,14 +227,58 @@ class SequenceMatcher:
         self._matches = None
 
     def set_seq1(self, a: Sequence) -> None:
-        """Specify a new sequence for sequence 1, resetting cached values."""
+        """Specify a new sequence for sequence 1, resetting cached values.
+        If an :py:class:`~edit_distance.Interner` was given, the codes of
+        sequence 2 are kept."""
         self._reset_object()
         self.seq1 = a
+        self._pattern = None
+        if self.interner is None:
+            self._codes2 = None
 
     def set_seq2(self, b: Sequence) -> None:
-        """Specify a new sequence for sequence 2, resetting cached values."""
+        """Specify a new sequence for sequence 2, resetting cached values.
+        Sequence 1 is kept compiled (see
+        :py:func:`~edit_distance.compile_pattern`), so comparing one sequence
+        against many is best done by calling this for each of them."""
         self._reset_object()
         self.seq2 = b
+        self._codes2 = None
+
+    def _compiled_seq1(self) -> CompiledPattern:
+        """Sequence 1 compiled with the current settings."""
+        pattern = self._pattern
+        if (
+            pattern is None
+            or pattern.seq1 is not self.seq1
+            or pattern.test is not self.test
+            or pattern.action_function is not self.action_function
+            or pattern.interner is not self.interner
+        ):
+            pattern = self._pattern = CompiledPattern(
+                self.seq1, self.test, self.action_function, self.interner
+            )
+        return pattern
+
+    def _prepared(self):
+        """The two sequences to compare and the masks of the first one (see
+        :py:meth:`CompiledPattern.encode`), reusing the codes of seq2."""
+        pattern = self._compiled_seq1()
+        # Codes from an interner outlast the pattern, but those from its own
+        # vocabulary don't.
+        owner = pattern.interner if pattern.interner is not None else pattern
+        cached = self._codes2
+        if (
+            cached is not None
+            and cached[0] is self.seq2
+            and cached[1] is owner
+            and pattern.codes is not pattern.seq1
+        ):
+            return pattern.codes, cached[2], pattern.masks
+        a, b, masks = pattern.encode(self.seq2)
+        if b is not self.seq2:
+            self._codes2 = (self.seq2, owner, b)
+        return a, b, masks
 
     def find_longest_match(self, alo, ahi, blo, bhi) -> None:
         """Not implemented!"""
@@ -157,22 +297,38 @@ class SequenceMatcher:
     def get_opcodes(self):
         """Returns a list of opcodes.  Opcodes are the same as defined by
         :py:mod:`difflib`."""
+        self._opcodes_wanted = True
         if self.opcodes is None:
-            d, m, opcodes = edit_distance_backpointer(
-                self.seq1,
-                self.seq2,
-                action_function=self.action_function,
-                test=self.test,
-            )
-            if self.dist is not None:
-                assert d == self.dist
-            if self._matches is not None:
-                assert m == self._matches
-            self.dist = d
-            self._matches = m
-            self.opcodes = opcodes
+            self._compute_opcodes()
         return self.opcodes
 
+    def _compute_opcodes(self, max_distance=None):
+        """Calls edit_distance_backpointer, and asserts that if we already
+        have values for matches and distance, that they match.  Returns the
+        distance, which is only a bound (and isn't kept) if it's more than
+        ``max_distance``."""
+        a, b, masks = self._prepared()
+        d, m, opcodes = _edit_distance_backpointer(
+            a, b, self.action_function, self.test, max_distance, None, masks
+        )
+        if m is None:
+            return d
+        if self.dist is not None:
+            assert d == self.dist
+        if self._matches is not None:
+            assert m == self._matches
+        self.dist = d
+        self._matches = m
+        self.opcodes = opcodes
+        return d
+
+    def _single_pass(self) -> bool:
+        """Whether to compute the opcodes along with the distance and
+        matches."""
+        if self.single_pass is not None:
+            return self.single_pass
+        return self._opcodes_wanted
+
     def get_grouped_opcodes(self, n=None):
         """Not implemented!"""
         raise NotImplementedError()
@@ -194,9 +350,8 @@ class SequenceMatcher:
     def _compute_distance_fast(self) -> None:
         """Calls edit_distance, and asserts that if we already have values for
         matches and distance, that they match."""
-        d, m = edit_distance(
-            self.seq1, self.seq2, action_function=self.action_function, test=self.test
-        )
+        a, b, masks = self._prepared()
+        d, m = _edit_distance(a, b, self.action_function, self.test, None, masks)
         if self.dist is not None:
             assert d == self.dist
         if self._matches is not None:
@@ -204,41 +359,249 @@ class SequenceMatcher:
         self.dist = d
         self._matches = m
 
-    def distance(self):
+    def distance(self, max_distance=None):
         """Returns the edit distance of the two loaded sequences.  This should
         be a little faster than getting the same information from
-        :py:meth:`get_opcodes`."""
+        :py:meth:`get_opcodes`.
+
+        If ``max_distance`` is given and the distance is greater than it,
+        ``max_distance + 1`` is returned instead (see
+        :py:func:`~edit_distance.edit_distance`)."""
+        if self.dist is None and self._single_pass():
+            d = self._compute_opcodes(max_distance)
+            if self.dist is None:
+                return d
+        if self.dist is None and max_distance is not None:
+            a, b, masks = self._prepared()
+            d, m = _edit_distance(
+                a, b, self.action_function, self.test, max_distance, masks
+            )
+            if m is None:
+                # Only a bound, so there's nothing to cache.
+                return d
+            self.dist = d
+            self._matches = m
+        if (
+            self.dist is None
+            and self.action_function is lowest_cost_action
+            and not self._matches_wanted
+            and len(self.seq1) * len(self.seq2) > _engines.SMALL_TABLE
+        ):
+            # The matches aren't needed, so leave them to matches() (unless
+            # the table is so small that they come for free).
+            a, b, masks = self._prepared()
+            self.dist = _levenshtein(a, b, self.test, None, masks)
         if self.dist is None:
             self._compute_distance_fast()
+        if max_distance is not None and self.dist > max_distance:
+            return max_distance + 1
         return self.dist
 
     def matches(self):
         """Returns the number of matches in the alignment of the two sequences.
         This should be a little faster than getting the same information from
         :py:meth:`get_opcodes`."""
+        self._matches_wanted = True
         if self._matches is None:
-            self._compute_distance_fast()
+            if self._single_pass():
+                self._compute_opcodes()
+            else:
+                self._compute_distance_fast()
         return self._matches
 
 
+# pylint: disable-next=too-many-positional-arguments
 def edit_distance(
-    seq1: Sequence, seq2: Sequence, action_function=lowest_cost_action, test=operator.eq
+    seq1: Sequence,
+    seq2: Sequence,
+    action_function=lowest_cost_action,
+    test=operator.eq,
+    max_distance: Optional[int] = None,
+    interner: Optional[Interner] = None,
 ):
     """
-    Computes the edit distance between the two given sequences.  This uses the
-    relatively fast method that only constructs two columns of the 2d array
-    for edits.  This function actually uses four columns because we track the
-    number of matches too.
+    Computes the edit distance between the two given sequences, and the
+    number of matches in the alignment.  How much memory that takes depends
+    on the engine (see below).  When the table is filled in cell by cell,
+    only four columns of it are kept: two of distances and two of match
+    counts.  The bit-parallel algorithm has to trace the alignment back to
+    count the matches, so it keeps every column, a few integers of ``m``
+    bits each.  That is about 9 MB for two sequences of 4000 elements.  For
+    tables of more than about 16 million cells it switches to Hirschberg's
+    linear space method, as :py:func:`~edit_distance.edit_distance_backpointer`
+    does.  The diagonal transition algorithm keeps its fronts, ``O(d * d)``
+    for ``d`` edits, and gives up early in linear space.
+    :py:func:`~edit_distance.levenshtein` keeps less, as it doesn't count
+    matches.
+
+    If ``max_distance`` is given, we only care about distances up to that
+    value: if the distance is greater, ``(max_distance + 1, None)`` is
+    returned.  With :py:func:`lowest_cost_action`, the diagonal transition
+    algorithm (see below) stops after ``max_distance`` edits.  A larger
+    ``max_distance`` doesn't save anything with the bit-parallel algorithm,
+    and otherwise only the diagonal band of width ``2 * max_distance + 1`` of
+    the table is computed.
+
+    When ``test`` is :py:func:`operator.eq`, ``action_function`` is
+    :py:func:`lowest_cost_action` or :py:func:`highest_match_action` and the
+    elements are hashable, the columns are instead computed with a
+    bit-parallel algorithm (Myers/Hyyrö, or Allison-Dix for the longest common
+    subsequence) that processes a whole column with a handful of integer
+    operations.  The result is identical.
+
+    With :py:func:`lowest_cost_action`, sequences that only differ by a few
+    edits are handled first by a diagonal transition algorithm
+    (Landau-Vishkin), whose running time grows with the number of edits
+    rather than with the size of the table.
+
+    With either of those two action functions, the common prefix and suffix
+    of the sequences are matched up front, and only the part in between goes
+    through the dynamic program.
+    Whenever the table is filled in cell by cell, those two action functions
+    are applied inline rather than called for every cell.
+
+    If an :py:class:`~edit_distance.Interner` is given, both sequences are
+    first mapped to integer codes with it, so that each comparison is between
+    two integers.  This requires ``test`` to be :py:func:`operator.eq`.
     """
+    if interner is not None:
+        seq1, seq2 = _intern(interner, seq1, seq2, test)
+    return _edit_distance(seq1, seq2, action_function, test, max_distance)
+
+
+# pylint: disable-next=too-many-positional-arguments
+def _edit_distance(seq1, seq2, action_function, test, max_distance, masks=None):
+    """:py:func:`~edit_distance.edit_distance`, once the sequences are interned.
+    ``masks`` are the :py:func:`~edit_distance._engines.match_masks` of
+    ``seq1``, if they're already known."""
     m = len(seq1)
     n = len(seq2)
     # Special, easy cases:
     if test is operator.eq and seq1 == seq2:
         return 0, n
-    if m == 0:
-        return n, 0
-    if n == 0:
-        return m, 0
+    prefix, suffix = _engines.common_affixes(seq1, seq2, action_function, test)
+    if prefix or suffix:
+        d, matches = _edit_distance(
+            _engines.trim(seq1, prefix, m - suffix),
+            _engines.trim(seq2, prefix, n - suffix),
+            action_function,
+            test,
+            max_distance,
+            _engines.trim_masks(masks, prefix, m - suffix),
+        )
+        return d, None if matches is None else matches + prefix + suffix
+    if max_distance is not None:
+        return _edit_distance_cutoff(
+            seq1, seq2, action_function, test, max_distance, False, masks
+        )
+    return _edit_distance_engines(seq1, seq2, action_function, test, masks)
+
+
+def _edit_distance_engines(seq1, seq2, action_function, test, masks):
+    """The ``(distance, matches)`` from the first engine that applies to the
+    sequences, as they are."""
+    m = len(seq1)
+    n = len(seq2)
+    if m == 0 or n == 0:
+        return m + n, 0
+    result = _engines.fast_alignment(seq1, seq2, action_function, test, masks=masks)
+    if result is None:
+        result = _engines.inline_dp(seq1, seq2, action_function, test)
+    if result is not None:
+        return result[0], result[1]
+    return _edit_distance_dp(seq1, seq2, action_function, test)
+
+
+def levenshtein(
+    seq1: Sequence,
+    seq2: Sequence,
+    test=operator.eq,
+    max_distance: Optional[int] = None,
+    interner: Optional[Interner] = None,
+) -> int:
+    """
+    Computes only the edit distance between the two given sequences (which is
+    the same as the distance from :py:func:`~edit_distance.edit_distance` with
+    :py:func:`lowest_cost_action`).  Since the number of matches isn't
+    needed, only the distances are kept: a single bit-parallel column when
+    ``test`` is :py:func:`operator.eq` and the elements are hashable, and
+    otherwise two columns of distances rather than four columns.  Likewise,
+    the diagonal transition algorithm only keeps its last front.
+
+    ``max_distance`` and ``interner`` work as in
+    :py:func:`~edit_distance.edit_distance`: if the distance is greater than
+    ``max_distance``, ``max_distance + 1`` is returned.  A small
+    ``max_distance`` stops the diagonal transition algorithm early; the
+    bit-parallel one costs the same either way.
+    """
+    if interner is not None:
+        seq1, seq2 = _intern(interner, seq1, seq2, test)
+    return _levenshtein(seq1, seq2, test, max_distance)
+
+
+def _levenshtein(seq1, seq2, test, max_distance, masks=None):
+    """:py:func:`~edit_distance.levenshtein`, once the sequences are interned,
+    with the ``masks`` of ``seq1`` if they're known."""
+    if test is operator.eq and seq1 == seq2:
+        return 0
+    prefix, suffix = _engines.common_affixes(seq1, seq2, lowest_cost_action, test)
+    if prefix or suffix:
+        masks = _engines.trim_masks(masks, prefix, len(seq1) - suffix)
+        seq1 = _engines.trim(seq1, prefix, len(seq1) - suffix)
+        seq2 = _engines.trim(seq2, prefix, len(seq2) - suffix)
+    m = len(seq1)
+    n = len(seq2)
+    longest = max(m, n)
+    # The distance is at most the longer length, so a max_distance that high
+    # cuts nothing off.
+    if max_distance is not None and max_distance >= longest:
+        max_distance = None
+    if max_distance is not None and abs(m - n) > max_distance:
+        return max_distance + 1
+    if not seq1 or not seq2:
+        return longest
+    return _levenshtein_engines(seq1, seq2, test, max_distance, masks)
+
+
+def _levenshtein_engines(seq1, seq2, test, max_distance, masks):
+    """The distance (capped at ``max_distance + 1``) from the first engine that
+    applies to the sequences, which are non-empty, with lengths at most
+    ``max_distance`` apart."""
+    m = len(seq1)
+    n = len(seq2)
+    longest = max(m, n)
+    # How many edits to look for with the diagonal transition algorithm,
+    # which only keeps one front here: as many as it's quicker for, but short
+    # sequences only take a word or so for the bit-parallel algorithm, so
+    # they only try it if it can stop at max_distance.
+    limit = _engines.diagonal_distance_limit(m, n, test)
+    if test is operator.eq and longest <= _engines.SHORT_SEQUENCE:
+        if max_distance is None or max_distance > limit:
+            limit = -1
+    if max_distance is not None and max_distance <= limit:
+        dist = _engines.diagonal_distance(seq1, seq2, test, max_distance)
+        return max_distance + 1 if dist is None else dist
+    if limit >= 0:
+        dist = _engines.diagonal_distance(seq1, seq2, test, limit)
+        if dist is not None:
+            return dist
+    dist = None
+    if test is operator.eq:
+        dist = _engines.myers_distance(seq1, seq2, masks)
+    if dist is None:
+        if max_distance is not None:
+            return _engines.banded(seq1, seq2, test, max_distance, False)[0]
+        return _engines.distance_dp(seq1, seq2, test)
+    if max_distance is not None and dist > max_distance:
+        return max_distance + 1
+    return dist
+
+
+def _edit_distance_dp(seq1, seq2, action_function, test):
+    """The dynamic program behind :py:func:`~edit_distance.edit_distance`,
+    calling ``test`` and ``action_function`` for every cell."""
+    m = len(seq1)
+    n = len(seq2)
     v0 = [0] * (n + 1)  # The two 'error' columns
     v1 = [0] * (n + 1)
     m0 = [0] * (n + 1)  # The two 'match' columns
@@ -280,20 +643,122 @@ def edit_distance(
     return v1[n], m1[n]
 
 
+# pylint: disable-next=too-many-positional-arguments
 def edit_distance_backpointer(
-    seq1, seq2, action_function=lowest_cost_action, test=operator.eq
+    seq1,
+    seq2,
+    action_function=lowest_cost_action,
+    test=operator.eq,
+    max_distance: Optional[int] = None,
+    linear_space: Optional[bool] = None,
+    interner: Optional[Interner] = None,
 ):
     """
     Similar to :py:func:`~edit_distance.edit_distance` except that this
     function keeps backpointers during the search.  This allows us to return
     the opcodes (i.e. the specific edits that were used to change from one
-    string to another).  This function contructs the full 2d array for the
-    backpointers only.
+    string to another).
+
+    Without linear space mode (below), the whole path has to be kept until it
+    is traced back.  When the table is filled in cell by cell, that's the full
+    2d array of backpointers, packed at 2 bits per cell.  The bit-parallel
+    algorithm keeps every column instead, a few integers of ``m`` bits each.
+    The diagonal transition algorithm keeps its fronts, ``O(d * d)`` for
+    ``d`` edits.
+
+    ``max_distance`` works as in :py:func:`~edit_distance.edit_distance`; if
+    it's exceeded, ``(max_distance + 1, None, None)`` is returned.
+
+    If ``linear_space`` is true, the opcodes are found with a divide and
+    conquer method (Hirschberg's), at the cost of computing most cells about
+    ``log(n)`` times.  It keeps a block of a few dozen columns at the bottom
+    of the recursion, and a couple of columns for each of the ``log(n)``
+    levels above it.  So the memory is ``O(m * log(n))`` rather than ``O(m * n)``.
+    The result is the same, ties included.  By default this is used for
+    sequences whose table would have more than about 16 million cells.
+    If ``max_distance`` is given, it's only ever used by default, since a
+    small enough ``max_distance`` bounds what's stored anyway.
+
+    The common prefix and suffix are handled as in
+    :py:func:`~edit_distance.edit_distance`, and the opcodes are the same as
+    they would be for the whole table.
+
+    ``interner`` works as in :py:func:`~edit_distance.edit_distance`; the
+    opcodes refer to positions, so they don't change.
     """
+    if interner is not None:
+        seq1, seq2 = _intern(interner, seq1, seq2, test)
+    return _edit_distance_backpointer(
+        seq1, seq2, action_function, test, max_distance, linear_space
+    )
+
+
+# pylint: disable-next=too-many-positional-arguments
+def _edit_distance_backpointer(
+    seq1, seq2, action_function, test, max_distance, linear_space, masks=None
+):
+    """:py:func:`~edit_distance.edit_distance_backpointer`, once the sequences
+    are interned, with the ``masks`` of ``seq1`` if they're known."""
     m: int = len(seq1)
     n: int = len(seq2)
-    # backpointer array:
-    bp = [[None for _ in range(n + 1)] for _ in range(m + 1)]
+    prefix, suffix = _engines.common_affixes(seq1, seq2, action_function, test)
+    if prefix or suffix:
+        d, matches, opcodes = _edit_distance_backpointer(
+            _engines.trim(seq1, prefix, m - suffix),
+            _engines.trim(seq2, prefix, n - suffix),
+            action_function,
+            test,
+            max_distance,
+            linear_space,
+            _engines.trim_masks(masks, prefix, m - suffix),
+        )
+        if matches is None:
+            return d, None, None
+        opcodes = _engines.untrim_opcodes(seq1, seq2, test, prefix, suffix, opcodes)
+        return d, matches + prefix + suffix, opcodes
+    if max_distance is not None:
+        return _edit_distance_cutoff(
+            seq1, seq2, action_function, test, max_distance, True, masks
+        )
+    return _edit_distance_backpointer_engines(
+        seq1, seq2, action_function, test, linear_space, masks
+    )
+
+
+# pylint: disable-next=too-many-positional-arguments
+def _edit_distance_backpointer_engines(
+    seq1, seq2, action_function, test, linear_space, masks
+):
+    """The ``(distance, matches, opcodes)`` from the first engine that
+    applies to the sequences, as they are."""
+    m = len(seq1)
+    n = len(seq2)
+    result = _engines.fast_alignment(
+        seq1, seq2, action_function, test, True, linear_space, masks
+    )
+    if result is not None:
+        return result
+    if linear_space or (
+        linear_space is None and m * n > _engines.LINEAR_SPACE_THRESHOLD
+    ):
+        engine = _engines.dp_engine(seq1, seq2, action_function, test)
+        return _engines.align_columns(m, n, engine, True, True)
+    result = _engines.inline_dp(seq1, seq2, action_function, test, True)
+    if result is None:
+        result = _edit_distance_backpointer_table(seq1, seq2, action_function, test)
+    return result
+
+
+def _edit_distance_backpointer_table(seq1, seq2, action_function, test):
+    """The dynamic program behind
+    :py:func:`~edit_distance.edit_distance_backpointer`, keeping the full 2d
+    array of backpointers."""
+    m = len(seq1)
+    n = len(seq2)
+    # backpointer array, packed at 2 bits per cell; each row is filled in with
+    # one byte per cell first
+    bp = _engines.BackpointerTable(n + 1)
+    row = bytearray([_engines.INSERT_CODE]) * (n + 1)
 
     # Two columns of the distance and match arrays
     d0 = [0] * (n + 1)  # The two 'distance' columns
@@ -304,11 +769,11 @@ def edit_distance_backpointer(
     # Fill in the first column
     for i in range(1, n + 1):
         d0[i] = i
-        bp[0][i] = INSERT
+    bp.append(row)
 
     for i in range(1, m + 1):
         d1[0] = i
-        bp[i][0] = DELETE
+        row = bytearray([_engines.DELETE_CODE]) * (n + 1)
 
         for j in range(1, n + 1):
             cost = 0 if test(seq1[i - 1], seq2[j - 1]) else 1
@@ -328,21 +793,22 @@ def edit_distance_backpointer(
             if action == EQUAL:
                 d1[j] = sub_cost
                 m1[j] = sub_match
-                bp[i][j] = EQUAL
+                row[j] = _engines.EQUAL_CODE
             elif action == REPLACE:
                 d1[j] = sub_cost
                 m1[j] = sub_match
-                bp[i][j] = REPLACE
+                row[j] = _engines.REPLACE_CODE
             elif action == INSERT:
                 d1[j] = ins_cost
                 m1[j] = ins_match
-                bp[i][j] = INSERT
+                row[j] = _engines.INSERT_CODE
             elif action == DELETE:
                 d1[j] = del_cost
                 m1[j] = del_match
-                bp[i][j] = DELETE
+                row[j] = _engines.DELETE_CODE
             else:
                 raise Exception("Invalid dynamic programming action returned!")
+        bp.append(row)
         # copy over the columns
         for k in range(n + 1):
             d0[k] = d1[k]
@@ -352,27 +818,65 @@ def edit_distance_backpointer(
     return d0[n], m0[n], opcodes
 
 
+def _intern(interner, seq1, seq2, test):
+    """Map both sequences to their codes in ``interner``."""
+    if test is not operator.eq:
+        raise ValueError("An interner can only be used with operator.eq as the test")
+    return interner.intern(seq1), interner.intern(seq2)
+
+
 def get_opcodes_from_bp_table(bp):
-    """Given a 2d list structure, create opcodes from the best path."""
-    x = len(bp) - 1
-    y = len(bp[0]) - 1
-    opcodes = []
-    while x != 0 or y != 0:
-        this_bp = bp[x][y]
-        if this_bp in [EQUAL, REPLACE]:
-            opcodes.append([this_bp, x - 1, x, y - 1, y])
-            x = x - 1
-            y = y - 1
-        elif this_bp == INSERT:
-            opcodes.append([INSERT, x, x, y - 1, y])
-            y = y - 1
-        elif this_bp == DELETE:
-            opcodes.append([DELETE, x - 1, x, y, y])
-            x = x - 1
+    """Given a 2d list structure (or a packed table of backpointers), create
+    opcodes from the best path."""
+    if isinstance(bp, _engines.BackpointerTable):
+        return _engines.trace_backpointers(bp.action, len(bp) - 1, bp.width - 1)
+    return _engines.trace_backpointers(
+        lambda x, y: bp[x][y], len(bp) - 1, len(bp[0]) - 1
+    )
+
+
+# pylint: disable-next=too-many-positional-arguments
+def _edit_distance_cutoff(
+    seq1, seq2, action_function, test, max_distance, opcodes, masks=None
+):
+    """Implements the ``max_distance`` argument of
+    :py:func:`~edit_distance.edit_distance` (and of
+    :py:func:`~edit_distance.edit_distance_backpointer` if ``opcodes``).
+
+    With :py:func:`lowest_cost_action`, a ``max_distance`` up to the usual
+    limit of the diagonal transition engine is all it has to go through.
+    Beyond that, the engines are tried as without a cutoff, since the
+    bit-parallel ones are quicker than computing the band cell by cell, which
+    is only done when they don't apply."""
+    m = len(seq1)
+    n = len(seq2)
+    exceeded = (max_distance + 1, None, None) if opcodes else (max_distance + 1, None)
+    # Every alignment needs at least this many insertions or deletions.
+    if abs(m - n) > max_distance:
+        return exceeded
+    if action_function is lowest_cost_action and max_distance < max(m, n):
+        linear_space = m * n > _engines.LINEAR_SPACE_THRESHOLD
+        if max_distance <= _engines.diagonal_transition_limit(m, n, test, linear_space):
+            result = _engines.diagonal_transition(
+                seq1, seq2, action_function, test, opcodes, max_distance
+            )
+            if result is None:
+                return exceeded
         else:
-            raise Exception("Invalid dynamic programming action in BP table!")
-    opcodes.reverse()
-    return opcodes
+            result = _engines.fast_alignment(
+                seq1, seq2, action_function, test, opcodes, masks=masks
+            )
+            if result is None:
+                result = _engines.banded(seq1, seq2, test, max_distance, opcodes)
+        if not opcodes:
+            result = result[:2]
+    elif opcodes:
+        result = _edit_distance_backpointer_engines(
+            seq1, seq2, action_function, test, None, masks
+        )
+    else:
+        result = _edit_distance_engines(seq1, seq2, action_function, test, masks)
+    return exceeded if result[0] > max_distance else result
 
 
 def main() -> int:
@@ -385,11 +889,14 @@ def main() -> int:
     file1 = sys.argv[1]
     file2 = sys.argv[2]
 
+    interner = Interner()
     with open(file1) as f1, open(file2) as f2:
         for line1, line2 in zip(f1, f2):
             print(f"Line 1: {line1.strip()}")
             print(f"Line 2: {line2.strip()}")
-            dist, _, _ = edit_distance_backpointer(line1.split(), line2.split())
+            dist, _, _ = edit_distance_backpointer(
+                line1.split(), line2.split(), interner=interner
+            )
             print(f"Distance: {dist}")
             print("=" * 80)
     return 0
@@ -0,0 +1,188 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Aligning a fixed sequence against others that grow (and shrink) at the end,
+such as the partial hypotheses of a streaming recognizer, or that share
+prefixes, such as an N-best list.
+"""
+
+import operator
+from collections.abc import Iterable, Sequence
+
+from edit_distance import _engines
+from edit_distance.actions import DELETE, highest_match_action, lowest_cost_action
+
+
+class IncrementalAligner:
+    """
+    Aligns ``seq1`` against a ``seq2`` that is built up one element at a time.
+
+    The aligner keeps one column of the dynamic programming table for each
+    element of ``seq2``, so appending an element (with :py:meth:`extend`) only
+    computes one new column, in ``O(len(seq1))`` time, and removing elements
+    from the end (with :py:meth:`truncate`) just drops columns.  The distance,
+    matches and opcodes are always those that
+    :py:func:`~edit_distance.edit_distance_backpointer` gives for the current
+    ``seq2``, with the same ``test`` and ``action_function``.
+    """
+
+    def __init__(
+        self,
+        seq1: Sequence,
+        seq2: Iterable = (),
+        test=operator.eq,
+        action_function=lowest_cost_action,
+    ):
+        """Initialize the aligner with ``seq1``, and optionally the first
+        elements of ``seq2``."""
+        self.seq1 = seq1
+        self.seq2: list = []
+        self.test = test
+        self.action_function = action_function
+        first, self._advance, self._traceback = _engines.dp_engine(
+            seq1, self.seq2, action_function, test
+        )
+        self._columns = [first]
+        self.extend(seq2)
+
+    def extend(self, tokens: Iterable):
+        """Append ``tokens`` to ``seq2``."""
+        rows = len(self.seq1)
+        for token in tokens:
+            self.seq2.append(token)
+            self._columns.append(self._advance(self._columns[-1], len(self.seq2), rows))
+
+    def append(self, token):
+        """Append one element to ``seq2``."""
+        self.extend((token,))
+
+    def truncate(self, length: int):
+        """Keep only the first ``length`` elements of ``seq2``."""
+        if length < 0:
+            raise ValueError("Can't truncate to a negative length")
+        del self.seq2[length:]
+        del self._columns[length + 1 :]
+
+    def update(self, seq2: Sequence):
+        """Change ``seq2`` to ``seq2``, keeping the columns of the prefix it
+        has in common with the current one.  This suits partial hypotheses
+        that are mostly, but not always, extended at the end."""
+        common = 0
+        for old, new in zip(self.seq2, seq2):
+            if old != new:
+                break
+            common += 1
+        self.truncate(common)
+        self.extend(seq2[common:])
+
+    def distance(self) -> int:
+        """The edit distance between ``seq1`` and ``seq2``."""
+        return self._columns[-1][0][-1]
+
+    def matches(self) -> int:
+        """The number of matches in the alignment of ``seq1`` and ``seq2``."""
+        return self._columns[-1][1][-1]
+
+    def get_opcodes(self) -> list:
+        """The opcodes of the alignment of ``seq1`` and ``seq2``, like
+        :py:meth:`edit_distance.SequenceMatcher.get_opcodes`.  Tracing back
+        takes ``O(len(seq1) + len(seq2))`` time."""
+        ops: list = []
+        i, _, _ = self._traceback(self._columns, 0, len(self.seq1), len(self.seq2), ops)
+        ops.extend(_engines.opcode(DELETE, x, 0) for x in range(i, 0, -1))
+        ops.reverse()
+        return ops
+
+    def __len__(self) -> int:
+        return len(self.seq2)
+
+
+def align_nbest(
+    seq1: Sequence,
+    hypotheses: Iterable,
+    test=operator.eq,
+    action_function=lowest_cost_action,
+    prune: bool = False,
+):
+    """
+    Aligns ``seq1`` against each of ``hypotheses`` (for example an N-best
+    list), sharing the work for their common prefixes.  Returns
+    ``(results, oracle)``: ``results[k]`` is the ``(distance, matches)`` that
+    :py:func:`~edit_distance.edit_distance` gives for ``hypotheses[k]``, and
+    ``oracle`` is the index of the first hypothesis with the lowest distance
+    (``None`` if there are no hypotheses).
+
+    The hypotheses are put in a prefix trie, so their elements must be
+    hashable.  One column of the table is computed for each node of the trie,
+    from the column of its parent, so a prefix shared by many hypotheses is
+    only aligned once.
+
+    With ``prune``, a branch of the trie is abandoned as soon as every cell of
+    its column is greater than the lowest distance found so far (the distance
+    never decreases along an alignment).  The hypotheses in that branch can't
+    be the oracle, and their results are ``None``.
+    """
+    root: tuple = ({}, [])
+    count = 0
+    for hyp in hypotheses:
+        node = root
+        for token in hyp:
+            node = node[0].setdefault(token, ({}, []))
+        node[1].append(count)
+        count += 1
+    m = len(seq1)
+    # The elements of the path from the root to the current node
+    path: list = []
+    first, advance, traceback = _nbest_engine(seq1, path, test, action_function, prune)
+    columns = [first]
+    results: list = [None] * count
+    best = None
+    stack = [(0, None, root)]
+    while stack:
+        depth, token, node = stack.pop()
+        if depth:
+            del path[depth - 1 :]
+            del columns[depth:]
+            path.append(token)
+            columns.append(advance(columns[-1], depth, m))
+            if prune and best is not None and min(columns[-1][0]) > best:
+                continue
+        if node[1]:
+            i, dist, matches = traceback(columns, 0, m, depth, None)
+            # Whatever is left of column 0 is deleted.
+            dist += i
+            for k in node[1]:
+                results[k] = (dist, matches)
+            if best is None or dist < best:
+                best = dist
+        stack.extend((depth + 1, t, child) for t, child in reversed(node[0].items()))
+    done = [k for k in range(count) if results[k] is not None]
+    oracle = min(done, key=lambda k: results[k][0], default=None)
+    return results, oracle
+
+
+def _nbest_engine(seq1, path, test, action_function, prune):
+    """The column functions (see :py:func:`_engines.align_columns`) for
+    :py:func:`align_nbest`.  The bit-parallel engines are used when possible,
+    but pruning needs every distance in the column, from
+    :py:func:`_engines.dp_engine`."""
+    masks = None
+    if not prune and test is operator.eq and seq1:
+        masks = _engines.match_masks(seq1)
+    if masks is not None and action_function is lowest_cost_action:
+        return _engines.myers_engine(path, masks)
+    if masks is not None and action_function is highest_match_action:
+        return _engines.lcs_engine(path, masks)
+    return _engines.dp_engine(seq1, path, action_function, test)
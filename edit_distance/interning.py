@@ -0,0 +1,94 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Mapping sequence elements to small integer codes, so that the dynamic
+program compares integers rather than (for example) whole strings.
+"""
+
+from collections.abc import Iterable, Sequence
+
+
+class Interner:
+    """
+    A vocabulary that gives each distinct element a dense integer code
+    (``0``, ``1``, ``2``, ...), in the order the elements are first seen.
+
+    Two elements get the same code exactly when they are equal, so
+    sequences of codes have the same edit distance and opcodes as the
+    sequences themselves (with :py:func:`operator.eq` as the test).  An
+    element that isn't equal to itself, like NaN, gets a new code every time
+    it's seen.  The same
+    interner can be passed to any number of calls to
+    :py:func:`~edit_distance.edit_distance` and
+    :py:func:`~edit_distance.edit_distance_backpointer`, and it can be
+    pickled, so each element of a corpus only has to be hashed into the
+    vocabulary once.  The elements must be hashable.
+    """
+
+    def __init__(self, tokens: Iterable = ()):
+        """Initialize the vocabulary, optionally with some ``tokens``."""
+        self.codes: dict = {}
+        self.tokens: list = []
+        for token in tokens:
+            self.code(token)
+
+    def code(self, token) -> int:
+        """Returns the code of ``token``, adding it to the vocabulary if it's
+        new."""
+        code = self.codes.get(token)
+        if code is None:
+            code = len(self.tokens)
+            self.tokens.append(token)
+            if token == token:  # pylint: disable=comparison-with-itself
+                self.codes[token] = code
+        return code
+
+    def intern(self, seq: Sequence) -> list:
+        """Returns the list of codes of the elements of ``seq``."""
+        codes = self.codes
+        try:
+            # Once the vocabulary is built up, every token is usually known.
+            return [codes[token] for token in seq]
+        except KeyError:
+            pass
+        tokens = self.tokens
+        result = []
+        for token in seq:
+            code = codes.get(token)
+            if code is None:
+                code = len(tokens)
+                tokens.append(token)
+                if token == token:  # pylint: disable=comparison-with-itself
+                    codes[token] = code
+            result.append(code)
+        return result
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token) -> bool:
+        return token in self.codes
+
+    def __getstate__(self):
+        # The codes are just the positions of the tokens.
+        return self.tokens
+
+    def __setstate__(self, tokens):
+        self.tokens = list(tokens)
+        self.codes = {
+            token: code
+            for code, token in enumerate(self.tokens)
+            if token == token  # pylint: disable=comparison-with-itself
+        }
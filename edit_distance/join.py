@@ -0,0 +1,106 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Similarity joins: finding every pair of sequences from two collections within
+some edit distance of each other.
+"""
+
+from collections.abc import Iterable, Iterator
+
+from edit_distance.edit_distance import levenshtein
+
+
+def similarity_join(first: Iterable, second: Iterable, max_distance: int) -> Iterator:
+    """
+    Generates ``(i, j, distance)`` for every sequence ``first[i]`` and
+    ``second[j]`` within ``max_distance`` edits of each other, in order of
+    ``j`` (then of ``i``).
+
+    This is the PassJoin algorithm.  Each sequence of ``first`` is split into
+    ``max_distance + 1`` segments, which are indexed.  By the pigeonhole
+    principle, a sequence within ``max_distance`` edits of it contains one of
+    those segments unchanged, and, counting the edits on either side of it,
+    only a few positions away from where the segment was.  So for each
+    sequence of ``second``, only the substrings at those positions are looked
+    up in the index, and only the sequences they lead to are compared, with
+    :py:func:`~edit_distance.levenshtein` cut off at ``max_distance``.  The
+    work grows with the number of sequences and of results, rather than with
+    the number of pairs.
+
+    ``second`` is only iterated over once, as the results are generated, so it
+    can be a stream.  ``first`` is kept in memory.  The elements must be
+    hashable.
+    """
+    if max_distance < 0:
+        raise ValueError("max_distance must be non-negative")
+    seqs = [tuple(seq) for seq in first]
+    index, short = _segment_index(seqs, max_distance)
+    lengths = {len(seq) for seq in seqs}
+    for j, other in enumerate(second):
+        other = tuple(other)
+        n = len(other)
+        candidates = set()
+        for length in range(max(0, n - max_distance), n + max_distance + 1):
+            if length not in lengths:
+                continue
+            if length <= max_distance:
+                candidates.update(short[length])
+                continue
+            delta = n - length
+            for number, (start, size) in enumerate(_segments(length, max_distance)):
+                # With segment number matched, at most number edits come
+                # before it and max_distance - number after it.
+                rest = max_distance - number
+                lo = max(start - number, start + delta - rest, 0)
+                hi = min(start + number, start + delta + rest, n - size)
+                for p in range(lo, hi + 1):
+                    found = index.get((length, number, other[p : p + size]))
+                    if found:
+                        candidates.update(found)
+        for i in sorted(candidates):
+            dist = levenshtein(seqs[i], other, max_distance=max_distance)
+            if dist <= max_distance:
+                yield i, j, dist
+
+
+def _segment_index(seqs: list, max_distance: int):
+    """The index of the segments of ``seqs``, by (length of the sequence,
+    number of the segment, elements), and the sequences too short to split
+    into non-empty segments, by length."""
+    index: dict = {}
+    short: dict = {}
+    for i, seq in enumerate(seqs):
+        length = len(seq)
+        if length <= max_distance:
+            short.setdefault(length, []).append(i)
+            continue
+        for number, (start, size) in enumerate(_segments(length, max_distance)):
+            index.setdefault((length, number, seq[start : start + size]), []).append(i)
+    return index, short
+
+
+def _segments(length: int, max_distance: int) -> list:
+    """The ``(start, size)`` of the ``max_distance + 1`` segments of a
+    sequence of ``length``, the last ``length % (max_distance + 1)`` of them
+    one longer than the others."""
+    count = max_distance + 1
+    size, longer = divmod(length, count)
+    segments = []
+    start = 0
+    for number in range(count):
+        extent = size + 1 if number >= count - longer else size
+        segments.append((start, extent))
+        start += extent
+    return segments
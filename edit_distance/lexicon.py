@@ -0,0 +1,93 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A trie of sequences that can be searched for those within some edit distance
+of a query.
+"""
+
+from collections.abc import Iterable, Sequence
+
+from edit_distance.automaton import LevenshteinAutomaton
+
+
+class Lexicon:
+    """
+    A set of sequences (the entries), such as the words of a vocabulary,
+    stored in a trie so that :py:meth:`search` can find those within some edit
+    distance of a query without aligning the query against each one.  The
+    elements of the entries must be hashable.
+    """
+
+    def __init__(self, entries: Iterable = ()):
+        """Initialize the lexicon, optionally with some ``entries``."""
+        # A node of the trie is [children by element, entry ending here or None].
+        self._root: list = [{}, None]
+        self._count = 0
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: Sequence):
+        """Add ``entry`` to the lexicon (if it isn't already in it)."""
+        node = self._root
+        for x in entry:
+            child = node[0].get(x)
+            if child is None:
+                child = node[0][x] = [{}, None]
+            node = child
+        if node[1] is None:
+            self._count += 1
+            node[1] = entry
+
+    def search(self, query: Sequence, max_distance: int) -> list:
+        """
+        Returns the ``(entry, distance)`` of the entries within
+        ``max_distance`` edits of ``query``, sorted by distance (then in the
+        order of the trie).
+
+        The trie is walked depth first, keeping one row of the dynamic
+        programming table (over the elements of ``query``) for each depth.
+        The row of a node is computed once for all of the entries that start
+        with its prefix, and the node's subtree is skipped as soon as every
+        distance in the row is over ``max_distance``, so most of the trie is
+        never visited.  The rows are the states of a
+        :py:class:`~edit_distance.LevenshteinAutomaton`, which also caches
+        the rows reached by each element.
+        """
+        automaton = LevenshteinAutomaton(query, max_distance)
+        results = []
+        stack = [(automaton.start, self._root)]
+        while stack:
+            state, node = stack.pop()
+            if node[1] is not None:
+                dist = automaton.state_distance(state)
+                if dist <= max_distance:
+                    results.append((node[1], dist))
+            for x, child in reversed(node[0].items()):
+                following = automaton.step(state, x)
+                if following is not None:
+                    stack.append((following, child))
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, entry: Sequence) -> bool:
+        node = self._root
+        for x in entry:
+            node = node[0].get(x)
+            if node is None:
+                return False
+        return node[1] is not None
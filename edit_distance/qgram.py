@@ -0,0 +1,132 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A q-gram inverted index, for finding the sequences of a collection within
+some edit distance of a query.
+"""
+
+from collections import Counter
+from collections.abc import Iterable, Sequence
+
+from edit_distance.edit_distance import levenshtein
+
+# Pads the ends of the sequences, so that their first and last elements are
+# in as many q-grams as the others.  Equal only to itself.
+_PAD = object()
+
+
+class QGramIndex:
+    """
+    An inverted index from the q-grams (runs of ``q`` elements) of a
+    collection of sequences to the sequences they occur in.
+
+    Each edit changes at most ``q`` of the q-grams of a sequence, so two
+    sequences within ``k`` edits of each other (padded at both ends with
+    ``q - 1`` extra elements, giving ``len(seq) + q - 1`` q-grams each) have at
+    least ``max(len(x), len(y)) + q - 1 - k * q`` q-grams in common, counting
+    repeats, and their lengths differ by at most ``k``.  :py:meth:`search`
+    counts the q-grams each sequence has in common with the query from the
+    inverted lists, and only computes the edit distance (with
+    :py:func:`~edit_distance.levenshtein`, cut off at ``max_distance``) for
+    the sequences that pass both filters.
+
+    Sequences are numbered in the order they're added, and can be removed by
+    number.  The elements must be hashable.
+    """
+
+    def __init__(self, entries: Iterable = (), q: int = 2):
+        """Initialize the index, optionally with some ``entries``."""
+        if q < 1:
+            raise ValueError("q must be at least 1")
+        self.q = q
+        self._entries: dict = {}
+        # The entries by q-gram, as {number: count}
+        self._postings: dict = {}
+        # The entries by length, as sets of numbers
+        self._lengths: dict = {}
+        self._next = 0
+        for entry in entries:
+            self.add(entry)
+
+    def _grams(self, seq: Sequence) -> Counter:
+        """The q-grams of ``seq`` once padded, and how often each occurs."""
+        q = self.q
+        padded = (_PAD,) * (q - 1) + tuple(seq) + (_PAD,) * (q - 1)
+        return Counter(padded[i : i + q] for i in range(len(padded) - q + 1))
+
+    def add(self, entry: Sequence) -> int:
+        """Add ``entry`` to the index, and return its number."""
+        number = self._next
+        self._next += 1
+        self._entries[number] = entry
+        for gram, count in self._grams(entry).items():
+            self._postings.setdefault(gram, {})[number] = count
+        self._lengths.setdefault(len(entry), set()).add(number)
+        return number
+
+    def remove(self, number: int):
+        """Remove the entry numbered ``number`` from the index."""
+        entry = self._entries.pop(number)
+        for gram in self._grams(entry):
+            postings = self._postings[gram]
+            del postings[number]
+            if not postings:
+                del self._postings[gram]
+        lengths = self._lengths[len(entry)]
+        lengths.discard(number)
+        if not lengths:
+            del self._lengths[len(entry)]
+
+    def search(self, query: Sequence, max_distance: int) -> list:
+        """Returns the ``(number, distance)`` of the entries within
+        ``max_distance`` edits of ``query``, sorted by distance (then by
+        number)."""
+        n = len(query)
+        # Lengths close enough to the query's
+        lengths = range(max(0, n - max_distance), n + max_distance + 1)
+        candidates: set = set()
+        if n + self.q - 1 - max_distance * self.q <= 0:
+            # Even the shortest entries could have no q-gram in common with
+            # the query, so only the length filter applies.
+            for length in lengths:
+                candidates.update(self._lengths.get(length, ()))
+        else:
+            common: Counter = Counter()
+            for gram, count in self._grams(query).items():
+                for number, found in self._postings.get(gram, {}).items():
+                    common[number] += count if count < found else found
+            entries = self._entries
+            for number, shared in common.items():
+                length = len(entries[number])
+                longest = length if length > n else n
+                if (
+                    abs(length - n) <= max_distance
+                    and shared >= longest + self.q - 1 - max_distance * self.q
+                ):
+                    candidates.add(number)
+        results = []
+        for number in candidates:
+            dist = levenshtein(query, self._entries[number], max_distance=max_distance)
+            if dist <= max_distance:
+                results.append((number, dist))
+        results.sort(key=lambda result: (result[1], result[0]))
+        return results
+
+    def __getitem__(self, number: int):
+        """The entry numbered ``number``."""
+        return self._entries[number]
+
+    def __len__(self) -> int:
+        return len(self._entries)
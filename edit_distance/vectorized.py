@@ -0,0 +1,279 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Edit distances computed with NumPy.  This module requires NumPy, which can be
+installed with the ``numpy`` extra (``pip install edit_distance[numpy]``).
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Optional
+
+import numpy as np
+
+from edit_distance.actions import highest_match_action, lowest_cost_action
+from edit_distance.edit_distance import edit_distance
+from edit_distance.interning import Interner
+
+# Roughly the number of bytes of arrays per cell of a row of a batch
+BATCH_CELL_BYTES = 64
+# Batches of fewer pairs than this are computed one pair at a time.
+MIN_BATCH = 8
+
+
+def edit_distance_vectorized(
+    seq1: Sequence,
+    seq2: Sequence,
+    action_function=lowest_cost_action,
+    interner: Optional[Interner] = None,
+):
+    """
+    Computes ``(distance, matches)`` like :py:func:`~edit_distance.edit_distance`
+    (with :py:func:`operator.eq` as the test), sweeping the table one
+    anti-diagonal at a time.  The cells of an anti-diagonal only depend on the
+    previous two, so each anti-diagonal is a handful of NumPy operations over
+    integer arrays, whatever the length of the sequences.
+
+    ``action_function`` must be :py:func:`~edit_distance.lowest_cost_action` or
+    :py:func:`~edit_distance.highest_match_action`; ties are broken the same
+    way, so the matches are identical too.  The elements are mapped to
+    integer codes with ``interner`` (or a new :py:class:`~edit_distance.Interner`),
+    so they must be hashable.
+    """
+    lowest = _is_lowest_cost(action_function)
+    if interner is None:
+        interner = Interner()
+    a = np.array(interner.intern(seq1), dtype=np.int32)
+    b = np.array(interner.intern(seq2), dtype=np.int32)
+    return _anti_diagonals(a, b, lowest)
+
+
+def edit_distance_batch(
+    pairs: Iterable,
+    action_function=lowest_cost_action,
+    interner: Optional[Interner] = None,
+    max_memory: int = 1 << 26,
+):
+    """
+    Computes ``(distance, matches)`` like :py:func:`~edit_distance.edit_distance`
+    for each ``(seq1, seq2)`` in ``pairs``, all at once.  Returns two NumPy
+    arrays: the distances and the numbers of matches, in the order of
+    ``pairs``.
+
+    The elements are interned (with ``interner``, or a new
+    :py:class:`~edit_distance.Interner`), and the sequences are padded into
+    two 2d arrays of codes.  The table is then filled in one row at a time for
+    every pair together, so there are only a few NumPy operations per row of
+    the longest first sequence, however many pairs there are.  This makes it
+    much faster than calling :py:func:`~edit_distance.edit_distance` for each
+    of many short pairs.  ``action_function`` must be
+    :py:func:`~edit_distance.lowest_cost_action` or
+    :py:func:`~edit_distance.highest_match_action`.
+
+    So that short pairs aren't padded to the length of the longest ones, the
+    pairs are grouped by the lengths of their sequences, and each group is
+    split into batches that take up to about ``max_memory`` bytes (64 MB by
+    default).  The few pairs in groups too small to be worth batching are
+    computed one at a time.
+    """
+    lowest = _is_lowest_cost(action_function)
+    if interner is None:
+        interner = Interner()
+    firsts = []
+    seconds = []
+    for seq1, seq2 in pairs:
+        firsts.append(interner.intern(seq1))
+        seconds.append(interner.intern(seq2))
+    dist = np.zeros(len(firsts), dtype=np.int32)
+    matches = np.zeros(len(firsts), dtype=np.int32)
+    for batch in _schedule(firsts, seconds, max_memory):
+        if len(batch) < MIN_BATCH:
+            # Not worth a pass over the rows; the bit-parallel engines are
+            # quicker for a handful of pairs.
+            for k in batch:
+                dist[k], matches[k] = edit_distance(
+                    firsts[k], seconds[k], action_function
+                )
+        else:
+            index = np.array(batch)
+            dist[index], matches[index] = _rows(
+                [firsts[k] for k in batch], [seconds[k] for k in batch], lowest
+            )
+    return dist, matches
+
+
+def _schedule(firsts, seconds, max_memory):
+    """Split the pairs (given by their index) into batches of similar lengths.
+
+    Pairs are grouped by the lengths of both sequences, to within a quarter
+    (which, on skewed lengths, works out better than finer groups of fewer
+    pairs), and each group is split into batches whose arrays fit in
+    ``max_memory`` bytes."""
+    groups: dict = {}
+    for k, (seq1, seq2) in enumerate(zip(firsts, seconds)):
+        key = (_length_class(len(seq1)), _length_class(len(seq2)))
+        groups.setdefault(key, []).append(k)
+    batches = []
+    for key in sorted(groups):
+        group = groups[key]
+        width = max(len(seconds[k]) for k in group) + 1
+        size = max(1, max_memory // (width * BATCH_CELL_BYTES))
+        batches.extend(
+            group[start : start + size] for start in range(0, len(group), size)
+        )
+    return batches
+
+
+def _length_class(length: int):
+    """Lengths below 8 are each in their own class, then there are 4 classes
+    for each doubling of the length."""
+    shift = max(0, length.bit_length() - 3)
+    return shift, length >> shift
+
+
+def _is_lowest_cost(action_function) -> bool:
+    """Whether ``action_function`` is :py:func:`lowest_cost_action` rather than
+    :py:func:`highest_match_action` (anything else can't be vectorized)."""
+    if action_function is lowest_cost_action:
+        return True
+    if action_function is highest_match_action:
+        return False
+    raise ValueError(
+        "Only lowest_cost_action and highest_match_action can be vectorized"
+    )
+
+
+def _pad(seqs, fill):
+    """A 2d array of the sequences of codes (one per row) padded with
+    ``fill``, and an array of their lengths."""
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.int32)
+    codes = np.full((len(seqs), max(lengths, default=0)), fill, dtype=np.int32)
+    for k, seq in enumerate(seqs):
+        codes[k, : len(seq)] = seq
+    return codes, lengths
+
+
+def _rows(firsts, seconds, lowest):
+    """The dynamic program for a batch of pairs of sequences of codes, one row
+    of the table at a time for all of the pairs.
+
+    Within a row, the only dependency is on the cell to the left (through an
+    insertion).  Taking the best of the substitution and the deletion first,
+    that chain is a cumulative minimum (of distances) or maximum (of
+    matches).  The action in each cell then follows, and the other quantity
+    is carried along runs of insertions with a forward fill."""
+    a, m = _pad(firsts, -1)
+    b, n = _pad(seconds, -2)
+    count = len(firsts)
+    cols = np.arange(b.shape[1] + 1)
+    dist = np.zeros(count, dtype=np.int32)
+    matches = np.zeros(count, dtype=np.int32)
+    # Row 0 of the table
+    d = np.tile(cols, (count, 1))
+    mm = np.zeros_like(d)
+    dist[m == 0] = n[m == 0]
+    for i in range(1, a.shape[1] + 1):
+        cost = (a[:, i - 1 : i] != b).astype(np.int32)
+        sub_cost = d[:, :-1] + cost
+        del_cost = d[:, 1:] + 1
+        sub_match = mm[:, :-1] + 1 - cost
+        del_match = mm[:, 1:]
+        if lowest:
+            d = np.empty_like(d)
+            d[:, 0] = i
+            d[:, 1:] = np.minimum(sub_cost, del_cost)
+            d = np.minimum.accumulate(d - cols, axis=1) + cols
+            ins_cost = d[:, :-1] + 1
+            take_sub = (sub_cost <= ins_cost) & (sub_cost <= del_cost)
+            take_ins = ~take_sub & (ins_cost <= del_cost)
+            mm = _forward_fill(np.where(take_sub, sub_match, del_match), take_ins, 0)
+        else:
+            mm = np.empty_like(mm)
+            mm[:, 0] = 0
+            mm[:, 1:] = np.maximum(sub_match, del_match)
+            mm = np.maximum.accumulate(mm, axis=1)
+            ins_match = mm[:, :-1]
+            take_sub = (sub_match >= ins_match) & (sub_match >= del_match)
+            take_ins = ~take_sub & (ins_match >= del_match)
+            # Each insertion adds one to the distance to its left.
+            value = np.where(take_sub, sub_cost, del_cost) - cols[1:]
+            d = _forward_fill(value, take_ins, i) + cols
+        done = np.flatnonzero(m == i)
+        dist[done] = d[done, n[done]]
+        matches[done] = mm[done, n[done]]
+    return dist, matches
+
+
+def _forward_fill(values, skip, first):
+    """Prepend a column of ``first`` to ``values``, then replace the values
+    where ``skip`` is set with the nearest value to their left."""
+    count, width = values.shape
+    filled = np.empty((count, width + 1), dtype=values.dtype)
+    filled[:, 0] = first
+    filled[:, 1:] = values
+    index = np.empty((count, width + 1), dtype=np.int32)
+    index[:, 0] = 0
+    index[:, 1:] = np.where(skip, 0, np.arange(1, width + 1))
+    index = np.maximum.accumulate(index, axis=1)
+    return np.take_along_axis(filled, index, axis=1)
+
+
+def _anti_diagonals(a, b, lowest):
+    """The dynamic program over the codes ``a`` and ``b``, one anti-diagonal
+    ``i + j == s`` at a time.  Each anti-diagonal is an array indexed by ``i``."""
+    m = len(a)
+    n = len(b)
+    if m == 0 or n == 0:
+        return m + n, 0
+    # b reversed, so the elements facing a[i - 1] on anti-diagonal s are a slice
+    rb = b[::-1].copy()
+    # Distances and match counts on anti-diagonals s - 2, s - 1 and s
+    d2, d1, d0 = (np.zeros(m + 1, dtype=np.int32) for _ in range(3))
+    m2, m1, m0 = (np.zeros(m + 1, dtype=np.int32) for _ in range(3))
+    d1[0] = d1[1] = 1  # anti-diagonal 1: cells (0, 1) and (1, 0)
+    for s in range(2, m + n + 1):
+        lo = max(1, s - n)
+        hi = min(m, s - 1)
+        if lo <= hi:
+            # Interior cells (i, s - i) for lo <= i <= hi
+            cost = a[lo - 1 : hi] != rb[n - s + lo : n - s + hi + 1]
+            sub_cost = d2[lo - 1 : hi] + cost
+            ins_cost = d1[lo : hi + 1] + 1
+            del_cost = d1[lo - 1 : hi] + 1
+            sub_match = m2[lo - 1 : hi] + ~cost
+            ins_match = m1[lo : hi + 1]
+            del_match = m1[lo - 1 : hi]
+            # Ties go to substitution, then insertion, then deletion.
+            if lowest:
+                take_sub = (sub_cost <= ins_cost) & (sub_cost <= del_cost)
+                take_ins = ins_cost <= del_cost
+            else:
+                take_sub = (sub_match >= ins_match) & (sub_match >= del_match)
+                take_ins = ins_match >= del_match
+            d0[lo : hi + 1] = np.where(
+                take_sub, sub_cost, np.where(take_ins, ins_cost, del_cost)
+            )
+            m0[lo : hi + 1] = np.where(
+                take_sub, sub_match, np.where(take_ins, ins_match, del_match)
+            )
+        # The cells on the edges of the table
+        if s <= n:
+            d0[0] = s
+            m0[0] = 0
+        if s <= m:
+            d0[s] = s
+            m0[s] = 0
+        d2, d1, d0 = d1, d0, d2
+        m2, m1, m0 = m1, m0, m2
+    return int(d1[m]), int(m1[m])
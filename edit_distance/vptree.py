@@ -0,0 +1,284 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A vantage point tree: a metric index of sequences under the edit distance,
+stored in flat arrays so that it can be saved to a file and memory-mapped.
+"""
+
+import heapq
+import mmap
+import pickle
+import random
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Sequence
+from typing import Optional
+
+from edit_distance.edit_distance import levenshtein
+from edit_distance.interning import Interner
+
+# The number of distances from a vantage point used to estimate their median
+MEDIAN_SAMPLE = 64
+# File header: magic, byte order (0 little, 1 big), number of sequences,
+# total length of the sequences, and size of the pickled vocabulary
+_HEADER = struct.Struct("<8s4q")
+_MAGIC = b"EDVPTREE"
+
+
+class VPTree:
+    """
+    A vantage point tree of sequences, for finding the stored sequences near
+    a query without computing the edit distance to each of them.
+
+    The tree is built in bulk from ``items``.  Each node holds a sequence
+    (the vantage point) and the median ``mu`` of the edit distances from it
+    to the sequences under it.  Those within ``mu`` go in its inside subtree,
+    the others in its outside subtree, and by the triangle inequality a query
+    only needs to visit the subtrees that can hold a result.  The median is
+    estimated from a sample (and lowered by one when more of the distances are
+    equal to it than below it, to keep the two sides even), so building the
+    tree only needs to know which side of it each sequence is on: each node
+    costs one :py:func:`~edit_distance.levenshtein` call per sequence under
+    it, cut off at ``mu``.
+
+    The sequences are interned with ``interner`` (or a new
+    :py:class:`~edit_distance.Interner`), so their elements must be hashable,
+    and only their codes are kept.  Queries give the indexes of the results in
+    ``items``; :py:meth:`sequence` gives back their elements.
+
+    Everything but the vocabulary is in flat integer arrays, which
+    :py:meth:`save` writes to a file.  :py:meth:`load` memory-maps the arrays
+    rather than reading them, so loading is quick, and processes forked from
+    the one that loaded the tree (or that each load the same file) share its
+    pages.  The tree can also be pickled.
+    """
+
+    def __init__(
+        self, items: Iterable = (), interner: Optional[Interner] = None, seed=0
+    ):
+        """Build the tree from ``items``, with vantage points chosen by a
+        :py:class:`random.Random` seeded with ``seed``."""
+        self.interner = interner if interner is not None else Interner()
+        offsets = array("q", [0])
+        codes = array("i")
+        for item in items:
+            codes.extend(self.interner.intern(item))
+            offsets.append(len(codes))
+        self._offsets = memoryview(offsets)
+        self._codes = memoryview(codes)
+        self._nodes = self._build(random.Random(seed))
+
+    def _build(self, rng):
+        """The arrays of the nodes, in depth first order: the index of the
+        vantage point, ``mu`` (-1 for a leaf), and the indexes of the inside
+        and outside children (-1 if there is none)."""
+        points = array("i")
+        mus = array("i")
+        inside = array("i")
+        outside = array("i")
+        # (indexes of the sequences in a subtree, parent's child array, or None)
+        stack: list = [(list(range(len(self))), None)] if len(self) else []
+        while stack:
+            subset, parent = stack.pop()
+            node = len(points)
+            if parent is not None:
+                parent[0][parent[1]] = node
+            # Swap a random vantage point to the end.
+            k = rng.randrange(len(subset))
+            subset[k], subset[-1] = subset[-1], subset[k]
+            point = subset.pop()
+            points.append(point)
+            inside.append(-1)
+            outside.append(-1)
+            if not subset:
+                mus.append(-1)
+                continue
+            vantage = self.sequence_codes(point)
+            sample = rng.sample(subset, min(len(subset), MEDIAN_SAMPLE))
+            known = {x: levenshtein(vantage, self.sequence_codes(x)) for x in sample}
+            mu = _split(sorted(known.values()))
+            mus.append(mu)
+            near = []
+            far = []
+            for x in subset:
+                dist = known.get(x)
+                if dist is None:
+                    dist = levenshtein(vantage, self.sequence_codes(x), max_distance=mu)
+                (near if dist <= mu else far).append(x)
+            if far:
+                stack.append((far, (outside, node)))
+            if near:
+                stack.append((near, (inside, node)))
+        return tuple(memoryview(nodes) for nodes in (points, mus, inside, outside))
+
+    def sequence_codes(self, index: int) -> list:
+        """The codes of the elements of ``items[index]``."""
+        return self._codes[self._offsets[index] : self._offsets[index + 1]].tolist()
+
+    def sequence(self, index: int) -> list:
+        """The elements of ``items[index]``."""
+        tokens = self.interner.tokens
+        return [tokens[code] for code in self.sequence_codes(index)]
+
+    def _encode(self, seq: Sequence) -> list:
+        # Elements that aren't in the vocabulary can't match any stored
+        # element, so they all get code -1 (and the vocabulary is unchanged).
+        codes = self.interner.codes
+        return [codes.get(x, -1) for x in seq]
+
+    def range_query(self, seq: Sequence, max_distance: int) -> list:
+        """Returns the ``(index, distance)`` of the sequences of ``items``
+        within ``max_distance`` edits of ``seq``, sorted by distance."""
+        query = self._encode(seq)
+        points, mus, inside, outside = self._nodes
+        results = []
+        stack = [0] if points else []
+        while stack:
+            node = stack.pop()
+            mu = mus[node]
+            # Beyond this, the distance only tells us to search outside.
+            limit = max_distance + max(mu, 0)
+            dist = levenshtein(
+                query, self.sequence_codes(points[node]), max_distance=limit
+            )
+            if dist <= max_distance:
+                results.append((points[node], dist))
+            if inside[node] >= 0 and dist - max_distance <= mu:
+                stack.append(inside[node])
+            if outside[node] >= 0 and dist + max_distance > mu:
+                stack.append(outside[node])
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def nearest(self, seq: Sequence, k: int = 1) -> list:
+        """
+        Returns the ``(index, distance)`` of the ``k`` sequences of ``items``
+        closest to ``seq`` (or of all of them, if there are fewer), sorted by
+        distance.  Ties for the last place are broken arbitrarily.  The
+        subtrees are visited in order of the lower bound that the triangle
+        inequality gives on the distances in them.
+        """
+        query = self._encode(seq)
+        points, mus, inside, outside = self._nodes
+        if k <= 0 or not points:
+            return []
+        # The best results so far, as a max-heap on (distance, index)
+        best: list = []
+        # Nodes to visit, as a min-heap on (lower bound, node)
+        queue = [(0, 0)]
+        while queue:
+            bound, node = heapq.heappop(queue)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            mu = mus[node]
+            limit = None
+            if len(best) == k:
+                limit = -best[0][0] + max(mu, 0)
+            dist = levenshtein(
+                query, self.sequence_codes(points[node]), max_distance=limit
+            )
+            if len(best) < k:
+                heapq.heappush(best, (-dist, -points[node]))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, -points[node]))
+            # Everything inside is within mu of the vantage point, and
+            # everything outside is further than that.
+            for child, bound in (
+                (inside[node], dist - mu),
+                (outside[node], mu + 1 - dist),
+            ):
+                if child >= 0 and (len(best) < k or bound < -best[0][0]):
+                    heapq.heappush(queue, (max(bound, 0), child))
+        return [(-index, -dist) for dist, index in sorted(best, reverse=True)]
+
+    def save(self, path):
+        """Write the tree to the file ``path``, for :py:meth:`load`.  The
+        arrays are written in this machine's byte order."""
+        vocabulary = pickle.dumps(self.interner)
+        with open(path, "wb") as f:
+            f.write(
+                _HEADER.pack(
+                    _MAGIC,
+                    int(sys.byteorder == "big"),
+                    len(self),
+                    len(self._codes),
+                    len(vocabulary),
+                )
+            )
+            for part in (self._offsets, self._codes) + self._nodes:
+                f.write(part)
+            f.write(vocabulary)
+
+    @classmethod
+    def load(cls, path, use_mmap: bool = True) -> "VPTree":
+        """Load a tree written by :py:meth:`save`.  With ``use_mmap``, the
+        arrays stay in the file, which is memory-mapped, rather than being
+        read into memory.  As the vocabulary is pickled, only load files from
+        a trusted source."""
+        with open(path, "rb") as f:
+            if use_mmap:
+                data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            else:
+                data = memoryview(f.read())
+        magic, big, count, length, size = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} isn't a saved VPTree")
+        if big != (sys.byteorder == "big"):
+            raise ValueError(f"{path} was saved with the other byte order")
+        tree = cls.__new__(cls)
+        stop = _HEADER.size + 8 * (count + 1)
+        tree._offsets = data[_HEADER.size : stop].cast("q")
+        start, stop = stop, stop + 4 * length
+        tree._codes = data[start:stop].cast("i")
+        nodes = []
+        for _ in range(4):
+            start, stop = stop, stop + 4 * count
+            nodes.append(data[start:stop].cast("i"))
+        tree._nodes = tuple(nodes)
+        tree.interner = pickle.loads(data[stop : stop + size])
+        return tree
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getstate__(self):
+        return (
+            self.interner,
+            self._offsets.tobytes(),
+            self._codes.tobytes(),
+            tuple(nodes.tobytes() for nodes in self._nodes),
+        )
+
+    def __setstate__(self, state):
+        self.interner, offsets, codes, nodes = state
+        self._offsets = memoryview(offsets).cast("q")
+        self._codes = memoryview(codes).cast("i")
+        self._nodes = tuple(memoryview(part).cast("i") for part in nodes)
+
+
+def _split(distances: list) -> int:
+    """The median of the sorted ``distances``, or one less if that puts the
+    number of them within it closer to half.  The distances are small
+    integers, so many can be equal to the median, and they'd all go inside."""
+    mu = distances[(len(distances) - 1) // 2]
+    if mu > 0:
+        half = len(distances) / 2
+        if abs(bisect_left(distances, mu) - half) < abs(
+            bisect_right(distances, mu) - half
+        ):
+            return mu - 1
+    return mu
@@ -15,13 +15,33 @@
 """
 Unit tests for edit_distance.
 """
+import importlib
+import operator
+import os
+import pickle
+import tempfile
 import unittest
+from collections import deque
+from unittest import mock
 
 from edit_distance import (
+    BKTree,
+    DeletionIndex,
+    IncrementalAligner,
+    Interner,
+    Lexicon,
+    QGramIndex,
     SequenceMatcher,
+    VPTree,
+    align_nbest,
+    build_automaton,
+    compile_pattern,
     edit_distance,
     edit_distance_backpointer,
+    get_opcodes_from_bp_table,
     highest_match_action,
+    levenshtein,
+    similarity_join,
 )
 
 
@@ -148,6 +168,92 @@ class TestEditDistance(unittest.TestCase):
         self.assertEqual(SequenceMatcher(a=[], b=[]).ratio(), 1.0)
         self.assertEqual(SequenceMatcher(a=[], b=[]).distance(), 0)
 
+    def test_common_prefix(self):
+        """The common prefix isn't simply matched up: as for the full table,
+        the insertion comes first here."""
+        self.assertEqual(
+            edit_distance_backpointer("ab", "aab"),
+            (
+                1,
+                2,
+                [["insert", 0, 0, 0, 1], ["equal", 0, 1, 1, 2], ["equal", 1, 2, 2, 3]],
+            ),
+        )
+
+    def test_unsliceable_sequences(self):
+        """Sequences that can't be sliced, with a common prefix and suffix."""
+        a = deque("xabcdefghijklmnopz")
+        b = deque("xabcdefhijklmnopqz")
+        same = lambda x, y: x == y  # noqa: E731
+        expected = edit_distance_backpointer(list(a), list(b))
+        self.assertEqual(expected[:2], (2, 17))
+        self.assertEqual(edit_distance(a, b), expected[:2])
+        self.assertEqual(edit_distance(a, b, test=same), expected[:2])
+        self.assertEqual(edit_distance(a, b, max_distance=1), (2, None))
+        self.assertEqual(edit_distance_backpointer(a, b), expected)
+        self.assertEqual(edit_distance_backpointer(a, b, test=same), expected)
+        self.assertEqual(levenshtein(a, b), 2)
+        self.assertEqual(levenshtein(a, b, test=same, max_distance=1), 2)
+
+    def test_max_distance(self):
+        """Distances above max_distance are reported as max_distance + 1."""
+        a = ["hi", "my", "name", "is", "andy"]
+        b = ["hi", "i'm", "my", "name's", "sandy"]
+        self.assertEqual(edit_distance(a, b, max_distance=4), (4, 1))
+        self.assertEqual(edit_distance(a, b, max_distance=3), (4, None))
+        self.assertEqual(edit_distance(a, b + ["x"] * 3, max_distance=2), (3, None))
+        self.assertEqual(
+            edit_distance_backpointer(a, b, max_distance=3), (4, None, None)
+        )
+        self.assertEqual(
+            edit_distance_backpointer(a, b, max_distance=4),
+            edit_distance_backpointer(a, b),
+        )
+        sm = SequenceMatcher(a=a, b=b)
+        self.assertEqual(sm.distance(max_distance=1), 2)
+        self.assertIsNone(sm.dist)
+        self.assertEqual(sm.distance(max_distance=10), 4)
+        self.assertEqual(sm.distance(max_distance=1), 2)
+        self.assertEqual(sm.matches(), 1)
+
+    def test_max_distance_cost(self):
+        """A cutoff never makes more comparisons than going without it."""
+        a = list(range(1000))
+        b = a[:100] + [-1] + a[100:500] + a[501:900] + [-2, -3] + a[900:]
+        for max_distance in (3, 4, 10, 100, 999):
+            calls = [0, 0]
+
+            def counting(x, y, calls=calls):
+                calls[0] += 1
+                return x == y
+
+            expected = edit_distance_backpointer(a, b, test=counting)
+            calls.reverse()
+            result = edit_distance_backpointer(
+                a, b, test=counting, max_distance=max_distance
+            )
+            if max_distance >= expected[0]:
+                self.assertEqual(result, expected)
+            else:
+                self.assertEqual(result, (max_distance + 1, None, None))
+            self.assertLessEqual(calls[0], calls[1])
+
+    def test_linear_space_fronts(self):
+        """In linear space mode, the diagonal transition engine gives up
+        before its fronts take more than linear space."""
+        engines = importlib.import_module("edit_distance._engines")
+        a = [i % 7 for i in range(400)]
+        b = [i % 5 for i in range(400)]
+        same = lambda x, y: x == y  # noqa: E731
+        expected = edit_distance_backpointer(a, b, test=same, linear_space=False)
+        with mock.patch.object(
+            engines, "diagonal_front", side_effect=engines.diagonal_front
+        ) as front:
+            result = edit_distance_backpointer(a, b, test=same, linear_space=True)
+        self.assertEqual(result, expected)
+        # Fronts for 0 to sqrt(len(a) + len(b)) edits
+        self.assertEqual(front.call_count, 29)
+
     def test_custom_test_function(self):
         """A custom test function must be honored even when the sequences
         compare equal with ==."""
@@ -330,3 +436,353 @@ class TestEditDistance(unittest.TestCase):
             ],
             sm.get_opcodes(),
         )
+
+    def test_not_equal_to_itself(self):
+        """An element that isn't equal to itself, like NaN, never matches,
+        even though it's found as a key."""
+        nan = float("nan")
+        a = [nan] + list("abcdefgh")
+        b = [nan] + list("hgfedcba")
+        same = lambda x, y: x == y  # noqa: E731
+        expected = edit_distance_backpointer(a, b, test=same)
+        self.assertEqual(expected[:2], (9, 0))
+        self.assertEqual(expected[2][0], ["replace", 0, 1, 0, 1])
+        self.assertEqual(edit_distance(a, b), (9, 0))
+        self.assertEqual(edit_distance_backpointer(a, b), expected)
+        self.assertEqual(compile_pattern(a).opcodes(b), expected[2])
+        self.assertEqual(SequenceMatcher(a=a, b=b).matches(), 0)
+        a = [1, nan, 2, 3, 4, 5, 6, 7, 8]
+        b = [9, nan, 2, 3, 4, 5, 6, 7, 0]
+        self.assertEqual(edit_distance(a, b), (3, 6))
+        self.assertEqual(levenshtein(a, b), 3)
+
+    def test_unhashable_elements(self):
+        """Unhashable elements fall back to the cell-by-cell computation."""
+        a = [["a"], ["b"], ["c"]]
+        b = [["a"], ["c"]]
+        self.assertEqual(edit_distance(a, b), (1, 2))
+        long_a = list("abcdefghijklmnopqrstuvwxyz")
+        long_b = [["z"]] + long_a[::-1]
+        self.assertEqual(edit_distance(long_a, long_b), (26, 1))
+        self.assertEqual(
+            edit_distance_backpointer(a, b),
+            (
+                1,
+                2,
+                [
+                    ["equal", 0, 1, 0, 1],
+                    ["delete", 1, 2, 1, 1],
+                    ["equal", 2, 3, 1, 2],
+                ],
+            ),
+        )
+
+    def test_interner(self):
+        """Interned sequences give the same results, and the vocabulary is
+        shared between calls and survives pickling."""
+        interner = Interner()
+        ref = ["hi", "there", "how", "are", "you"]
+        hyp = ["hi", "here", "how", "are", "you", "doing"]
+        self.assertEqual(
+            edit_distance_backpointer(ref, hyp, interner=interner),
+            edit_distance_backpointer(ref, hyp),
+        )
+        self.assertEqual(interner.intern(ref), [0, 1, 2, 3, 4])
+        self.assertEqual(len(interner), 7)
+        self.assertEqual(edit_distance(hyp, ref, interner=interner), (2, 4))
+        self.assertEqual(len(interner), 7)
+        copy = pickle.loads(pickle.dumps(interner))
+        self.assertEqual(copy.intern(hyp), interner.intern(hyp))
+        self.assertEqual(copy.tokens, interner.tokens)
+        sm = SequenceMatcher(a=ref, b=hyp, interner=copy)
+        self.assertEqual(sm.distance(), 2)
+        self.assertEqual(len(copy), 7)
+        with self.assertRaises(ValueError):
+            edit_distance(ref, hyp, test=operator.ne, interner=interner)
+        # NaN isn't equal to itself, so it gets a new code each time.
+        nan = float("nan")
+        codes = interner.intern([nan, "hi", nan])
+        self.assertEqual(codes[1], 0)
+        self.assertEqual(len(set(codes)), 3)
+        self.assertEqual(edit_distance([nan], [nan], interner=interner), (1, 0))
+        self.assertNotIn(nan, pickle.loads(pickle.dumps(interner)).codes)
+
+    def test_levenshtein(self):
+        """The distance alone, without the matches."""
+        ref = ["hi", "there", "how", "are", "you"]
+        hyp = ["hi", "here", "how", "are", "you", "doing"]
+        self.assertEqual(levenshtein(ref, hyp), 2)
+        self.assertEqual(levenshtein(ref, hyp, max_distance=1), 2)
+        self.assertEqual(levenshtein("kitten", "sitting"), 3)
+        self.assertEqual(levenshtein([["a"], ["b"]], [["b"]]), 1)
+        sm = SequenceMatcher(a=ref, b=hyp)
+        self.assertEqual(sm.distance(), 2)
+        self.assertEqual(sm.matches(), 4)
+
+    def test_get_opcodes_from_bp_table(self):
+        """A table of backpointers can still be given as nested lists."""
+        bp = [[None, "insert"], ["delete", "replace"], ["delete", "delete"]]
+        self.assertEqual(
+            get_opcodes_from_bp_table(bp),
+            [["replace", 0, 1, 0, 1], ["delete", 1, 2, 1, 1]],
+        )
+
+    def test_compile_pattern(self):
+        """One sequence compared against several others."""
+        ref = ["hi", "there", "how", "are", "you"]
+        pattern = compile_pattern(ref)
+        self.assertEqual(pattern.distance(["hi", "here", "how", "are", "you"]), 1)
+        self.assertEqual(pattern.matches(["you", "are", "there"]), 1)
+        self.assertEqual(
+            pattern.opcodes(["hi", "you"]),
+            [
+                ["equal", 0, 1, 0, 1],
+                ["delete", 1, 2, 1, 1],
+                ["delete", 2, 3, 1, 1],
+                ["delete", 3, 4, 1, 1],
+                ["equal", 4, 5, 1, 2],
+            ],
+        )
+        self.assertEqual(compile_pattern([["a"], "b"]).distance(["b", ["c"]]), 2)
+        sm = SequenceMatcher(a=ref, b=["hi"])
+        self.assertEqual(sm.distance(), 4)
+        compiled = sm._compiled_seq1()  # pylint: disable=protected-access
+        sm.set_seq2(["how", "are", "you"])
+        self.assertEqual(sm.distance(), 2)
+        self.assertIs(sm._compiled_seq1(), compiled)  # pylint: disable=protected-access
+
+    def test_sequence_matcher_keeps_seq2(self):
+        """With an interner, replacing sequence 1 keeps the codes of sequence
+        2.  Without one, they're looked up in sequence 1's vocabulary, which
+        doesn't grow."""
+        hyp = ["hi", "here", "how", "are", "you", "doing"]
+        sm = SequenceMatcher(a=["hi", "there"], b=hyp)
+        for i in range(100):
+            sm.set_seq2([f"word{i}", "hi"])
+            self.assertEqual(sm.distance(), 2)
+        pattern = sm._compiled_seq1()  # pylint: disable=protected-access
+        self.assertEqual(pattern.vocabulary, {"hi": 0, "there": 1})
+        sm = SequenceMatcher(a=["hi", "there"], b=hyp, interner=Interner())
+        self.assertEqual(sm.distance(), 5)
+        codes = sm._prepared()[1]  # pylint: disable=protected-access
+        sm.set_seq1(["how", "are", "you"])
+        self.assertEqual(sm.distance(), 3)
+        self.assertIs(sm._prepared()[1], codes)  # pylint: disable=protected-access
+        sm = SequenceMatcher(a=[["a"], ["b"]], b=[["b"]])
+        self.assertEqual(sm.distance(), 1)
+        sm.set_seq1([["b"]])
+        self.assertEqual(sm.get_opcodes(), [["equal", 0, 1, 0, 1]])
+
+    def test_single_pass(self):
+        """Asking for the distance, matches and opcodes takes a single pass
+        when the opcodes are known to be wanted."""
+        core = importlib.import_module("edit_distance.edit_distance")
+        # No common prefix or suffix, which would be another (recursive) call
+        ref = ["hi", "there", "how", "are", "you"]
+        hyp = ["here", "how", "are", "you", "doing"]
+        expected = edit_distance_backpointer(ref, hyp)
+        passes = {}
+        for name in ("_edit_distance", "_levenshtein", "_edit_distance_backpointer"):
+            passes[name] = mock.patch.object(
+                core, name, side_effect=getattr(core, name)
+            ).start()
+        self.addCleanup(mock.patch.stopall)
+
+        def count():
+            total = sum(p.call_count for p in passes.values())
+            for p in passes.values():
+                p.reset_mock()
+            return total
+
+        sm = SequenceMatcher(a=ref, b=hyp, single_pass=True)
+        self.assertEqual(sm.distance(), expected[0])
+        self.assertEqual(sm.matches(), expected[1])
+        self.assertEqual(sm.get_opcodes(), expected[2])
+        self.assertEqual(count(), 1)
+        sm = SequenceMatcher(a=ref, b=hyp)
+        sm.distance()
+        sm.matches()
+        sm.get_opcodes()
+        # The table is small enough for distance() to count the matches too.
+        self.assertEqual(count(), 2)
+        sm = SequenceMatcher(a=ref + ref, b=hyp + hyp)
+        sm.distance()
+        sm.matches()
+        sm.get_opcodes()
+        self.assertEqual(count(), 3)
+        sm.set_seqs(hyp, ref)
+        self.assertEqual(sm.distance(), expected[0])
+        self.assertEqual(sm.matches(), expected[1])
+        sm.get_opcodes()
+        self.assertEqual(count(), 1)
+
+    def test_incremental_aligner(self):
+        """Aligning against partial hypotheses that grow at the end."""
+        ref = ["hi", "there", "how", "are", "you"]
+        aligner = IncrementalAligner(ref)
+        self.assertEqual((aligner.distance(), aligner.matches()), (5, 0))
+        aligner.extend(["hi", "here"])
+        self.assertEqual((aligner.distance(), aligner.matches()), (4, 1))
+        aligner.append("how")
+        self.assertEqual(len(aligner), 3)
+        self.assertEqual((aligner.distance(), aligner.matches()), (3, 2))
+        aligner.truncate(1)
+        self.assertEqual(aligner.seq2, ["hi"])
+        self.assertEqual((aligner.distance(), aligner.matches()), (4, 1))
+        aligner.update(["hi", "there", "now", "are", "you"])
+        self.assertEqual(
+            aligner.get_opcodes(),
+            edit_distance_backpointer(ref, aligner.seq2)[2],
+        )
+        self.assertRaises(ValueError, aligner.truncate, -1)
+
+    def test_align_nbest(self):
+        """Aligning an N-best list, sharing the common prefixes."""
+        ref = ["hi", "there", "how", "are", "you"]
+        nbest = [
+            ["hi", "here", "how", "are", "you", "doing"],
+            ["hi", "here", "how", "are", "you"],
+            ["hi", "there", "now", "are", "you"],
+            ["hi", "there", "now", "are", "you"],
+            ["bye", "bye", "bye"],
+        ]
+        results, oracle = align_nbest(ref, nbest)
+        self.assertEqual(results, [(2, 4), (1, 4), (1, 4), (1, 4), (5, 0)])
+        self.assertEqual(oracle, 1)
+        results, oracle = align_nbest(ref, nbest, prune=True)
+        self.assertEqual(results[1:4], [(1, 4), (1, 4), (1, 4)])
+        self.assertIsNone(results[4])
+        self.assertEqual(oracle, 1)
+        self.assertEqual(align_nbest(ref, []), ([], None))
+
+    def test_build_automaton(self):
+        """Testing candidates against a query with a Levenshtein automaton."""
+        automaton = build_automaton("spelling", 2)
+        self.assertTrue(automaton.accepts("speling"))
+        self.assertTrue(automaton.accepts("spellings"))
+        self.assertFalse(automaton.accepts("spell"))
+        self.assertEqual(automaton.distance("spelling"), 0)
+        self.assertEqual(automaton.distance("pelican"), 3)
+        ref = ["hi", "there", "how", "are", "you"]
+        automaton = build_automaton(ref, 1)
+        self.assertTrue(automaton.accepts(["hi", "here", "how", "are", "you"]))
+        self.assertFalse(automaton.accepts(["how", "are", "you"]))
+        self.assertRaises(ValueError, build_automaton, ref, -1)
+        self.assertRaises(TypeError, build_automaton, [["hi"]], 1)
+
+    def test_lexicon(self):
+        """Searching a trie of entries for those near a query."""
+        lexicon = Lexicon(["spelling", "spell", "spelled", "swelling", "smelling"])
+        lexicon.add("spelling")
+        self.assertEqual(len(lexicon), 5)
+        self.assertIn("spell", lexicon)
+        self.assertNotIn("spel", lexicon)
+        self.assertEqual(
+            lexicon.search("speling", 1),
+            [("spelling", 1)],
+        )
+        self.assertEqual(
+            lexicon.search("spelling", 1),
+            [("spelling", 0), ("swelling", 1), ("smelling", 1)],
+        )
+        self.assertEqual(Lexicon().search("spelling", 3), [])
+        lexicon = Lexicon([("hi", "there"), ("hi", "here"), ("bye",)])
+        self.assertEqual(
+            lexicon.search(["hi", "there"], 1),
+            [(("hi", "there"), 0), (("hi", "here"), 1)],
+        )
+
+    def test_bk_tree(self):
+        """Range and nearest neighbour queries on a BK-tree."""
+        tree = BKTree(["spelling", "spell", "spelled", "swelling", "smelling"])
+        tree.add("spell")
+        self.assertEqual(len(tree), 5)
+        self.assertEqual(tree.range_query("speling", 1), [("spelling", 1)])
+        self.assertEqual(
+            sorted(tree.range_query("spelling", 1)),
+            [("smelling", 1), ("spelling", 0), ("swelling", 1)],
+        )
+        self.assertEqual(tree.nearest("spel"), [("spell", 1)])
+        self.assertEqual([d for _, d in tree.nearest("spel", 3)], [1, 3, 4])
+        self.assertEqual(len(tree.nearest("spel", 10)), 5)
+        # Queries don't grow the vocabulary.
+        size = len(tree.interner)
+        self.assertEqual(len(tree.range_query("quizzing", 5)), 3)
+        self.assertEqual(tree.nearest("quiz"), [("spell", 5)])
+        self.assertEqual(len(tree.interner), size)
+        self.assertEqual(BKTree().nearest("spel", 3), [])
+        self.assertEqual(BKTree().range_query("spel", 3), [])
+
+    def test_vp_tree(self):
+        """Queries on a VP-tree, and saving and loading it."""
+        words = ["spelling", "spell", "spelled", "swelling", "smelling", "spell"]
+        tree = VPTree(words)
+        self.assertEqual(len(tree), 6)
+        self.assertEqual(tree.range_query("speling", 1), [(0, 1)])
+        self.assertEqual(
+            sorted(tree.range_query("spelling", 1)), [(0, 0), (3, 1), (4, 1)]
+        )
+        self.assertEqual(tree.nearest("spel", 2), [(1, 1), (5, 1)])
+        self.assertEqual("".join(tree.sequence(3)), "swelling")
+        self.assertEqual(VPTree().nearest("spel"), [])
+        self.assertEqual(VPTree().range_query("spel", 1), [])
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(copy.nearest("spel", 2), [(1, 1), (5, 1)])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.vpt")
+            tree.save(path)
+            for use_mmap in (True, False):
+                loaded = VPTree.load(path, use_mmap)
+                self.assertEqual(len(loaded), 6)
+                self.assertEqual(loaded.range_query("speling", 1), [(0, 1)])
+                self.assertEqual("".join(loaded.sequence(4)), "smelling")
+                del loaded
+            with open(path, "r+b") as f:
+                f.write(b"NOTATREE")
+            self.assertRaises(ValueError, VPTree.load, path)
+
+    def test_deletion_index(self):
+        """Looking up entries by their deletion variants."""
+        words = ["spelling", "spell", "spelled", "swelling", "smelling"]
+        for hashes_only in (False, True):
+            index = DeletionIndex(words, hashes_only=hashes_only)
+            self.assertEqual(len(index), 5)
+            self.assertEqual(index.search("speling", 1), [("spelling", 1)])
+            self.assertEqual(
+                index.search("spelling"),
+                [("spelling", 0), ("swelling", 1), ("smelling", 1)],
+            )
+            self.assertEqual(index.search("speled"), [("spelled", 1), ("spell", 2)])
+        index = DeletionIndex([("hi", "there"), ("hi", "here")], 1, None)
+        self.assertEqual(
+            index.search(["hi", "there"]), [(("hi", "there"), 0), (("hi", "here"), 1)]
+        )
+        self.assertRaises(ValueError, index.search, "spelling", 2)
+        self.assertRaises(ValueError, DeletionIndex, words, 2, 2)
+
+    def test_qgram_index(self):
+        """Searching a q-gram index, with entries added and removed."""
+        index = QGramIndex(["spelling", "spell", "spelled", "swelling"])
+        self.assertEqual(index.add("smelling"), 4)
+        self.assertEqual(index.search("spelling", 1), [(0, 0), (3, 1), (4, 1)])
+        index.remove(3)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.search("spelling", 1), [(0, 0), (4, 1)])
+        self.assertEqual(index[4], "smelling")
+        self.assertEqual(index.search("sp", 3), [(1, 3)])
+        self.assertRaises(KeyError, index.remove, 3)
+        index = QGramIndex([("hi", "there"), ("hi", "here")], q=3)
+        self.assertEqual(index.search(["hi", "there"], 1), [(0, 0), (1, 1)])
+
+    def test_similarity_join(self):
+        """Every pair within the distance, from two collections."""
+        first = ["spelling", "spell", "swelling", "sp"]
+        second = iter(["speling", "smelling", "spells", "s"])
+        self.assertEqual(
+            list(similarity_join(first, second, 1)),
+            [(0, 0, 1), (0, 1, 1), (2, 1, 1), (1, 2, 1), (3, 3, 1)],
+        )
+        self.assertEqual(list(similarity_join([], ["spell"], 2)), [])
+        pairs = similarity_join([("hi", "there")], [("hi", "here"), ("bye",)], 1)
+        self.assertEqual(list(pairs), [(0, 0, 1)])
+        self.assertRaises(ValueError, list, similarity_join(first, first, -1))
@@ -30,6 +30,12 @@ class TestLongSequences(unittest.TestCase):
             TestLongSequences.bp_expected_result,
             edit_distance_backpointer(TestLongSequences.a, TestLongSequences.b),
         )
+        self.assertEqual(
+            TestLongSequences.bp_expected_result,
+            edit_distance_backpointer(
+                TestLongSequences.a, TestLongSequences.b, linear_space=True
+            ),
+        )
 
     # these were generated with:
     # [random.choice(string.ascii_lowercase) for i in range(1000)]
@@ -15,10 +15,34 @@
 """
 Property-based tests for edit_distance using hypothesis.
 """
+import importlib
+import operator
+from unittest import mock
+
 from hypothesis import given
 from hypothesis import strategies as st
 
-from edit_distance import edit_distance, edit_distance_backpointer
+from edit_distance import (
+    BKTree,
+    DeletionIndex,
+    IncrementalAligner,
+    Interner,
+    Lexicon,
+    QGramIndex,
+    SequenceMatcher,
+    VPTree,
+    align_nbest,
+    build_automaton,
+    compile_pattern,
+    edit_distance,
+    edit_distance_backpointer,
+    highest_match_action,
+    levenshtein,
+    lowest_cost_action,
+    similarity_join,
+)
+
+engines = importlib.import_module("edit_distance._engines")
 
 # Small alphabets so generated pairs frequently share elements.
 ints = st.lists(st.integers(0, 3), max_size=10)
@@ -91,6 +115,322 @@ def test_agrees_with_wagner_fischer(pair):
     assert edit_distance_backpointer(a, b)[0] == expected
 
 
+@given(pairs)
+def test_bit_parallel_agrees_with_dynamic_program(pair):
+    """The bit-parallel engine returns exactly what the cell-by-cell dynamic
+    program returns, including the number of matches and the opcodes."""
+    a, b = pair
+    assert edit_distance(a, b) == edit_distance(a, b, action_function=lowest_cost)
+    assert edit_distance_backpointer(a, b) == edit_distance_backpointer(
+        a, b, action_function=lowest_cost
+    )
+
+
+@given(pairs)
+def test_bit_parallel_lcs_agrees_with_dynamic_program(pair):
+    """Same as above, when maximizing matches rather than minimizing edits."""
+    a, b = pair
+    assert edit_distance(a, b, action_function=highest_match_action) == edit_distance(
+        a, b, action_function=highest_match
+    )
+    assert edit_distance_backpointer(
+        a, b, action_function=highest_match_action
+    ) == edit_distance_backpointer(a, b, action_function=highest_match)
+
+
+@given(pairs, st.integers(0, 12))
+def test_max_distance(pair, k):
+    """With a cutoff, the result is either the exact one or the sentinel."""
+    a, b = pair
+    for action in (lowest_cost_action, highest_match_action):
+        dist, matches = edit_distance(a, b, action_function=action)
+        expected = (dist, matches) if dist <= k else (k + 1, None)
+        assert edit_distance(a, b, action, max_distance=k) == expected
+        dist, matches, opcodes = edit_distance_backpointer(a, b, action)
+        expected_bp = (dist, matches, opcodes) if dist <= k else (k + 1, None, None)
+        assert edit_distance_backpointer(a, b, action, max_distance=k) == expected_bp
+
+
+@given(pairs)
+def test_linear_space(pair):
+    """The divide and conquer method finds the same alignment as the full
+    table, ties included (splitting all the way down to single columns)."""
+    a, b = pair
+    with mock.patch.object(engines, "LINEAR_SPACE_BLOCK", 1):
+        for action in (lowest_cost_action, highest_match_action, lowest_cost):
+            expected = edit_distance_backpointer(a, b, action, linear_space=False)
+            assert edit_distance_backpointer(a, b, action, linear_space=True) == (
+                expected
+            )
+
+
+@given(pairs)
+def test_diagonal_transition(pair):
+    """The diagonal transition engine, used for however many edits it takes,
+    agrees with the dynamic program, opcodes included."""
+    a, b = pair
+    expected = edit_distance_backpointer(a, b, lowest_cost)
+    unlimited = lambda m, n, test, linear_space=False: m + n  # noqa: E731
+    with mock.patch.object(engines, "diagonal_transition_limit", unlimited):
+        assert edit_distance_backpointer(a, b) == expected
+        assert edit_distance_backpointer(a, b, test=same) == expected
+        assert edit_distance(a, b, test=same) == expected[:2]
+
+
+@given(st.tuples(strs, strs, strs, strs) | st.tuples(ints, ints, ints, ints))
+def test_common_affixes(parts):
+    """Matching a common prefix and suffix up front gives the same result as
+    the full table, ties at the boundaries included."""
+    prefix, x, y, suffix = parts
+    a = prefix + x + suffix
+    b = prefix + y + suffix
+    for action, generic in (
+        (lowest_cost_action, lowest_cost),
+        (highest_match_action, highest_match),
+    ):
+        expected = edit_distance_backpointer(a, b, generic)
+        assert edit_distance_backpointer(a, b, action) == expected
+        assert edit_distance_backpointer(a, b, action, test=same) == expected
+        assert edit_distance(a, b, action, test=same) == expected[:2]
+
+
+@given(pairs)
+def test_interner(pair):
+    """Interning doesn't change the results, whatever the action function."""
+    a, b = pair
+    interner = Interner()
+    for action in (lowest_cost_action, highest_match_action, lowest_cost):
+        expected = edit_distance_backpointer(a, b, action)
+        assert edit_distance_backpointer(a, b, action, interner=interner) == expected
+        assert edit_distance(a, b, action, interner=interner) == expected[:2]
+
+
+@given(pairs)
+def test_inline_dp(pair):
+    """The dynamic program with the built in action functions written out
+    agrees with calling them for every cell."""
+    a, b = pair
+    for action, generic in (
+        (lowest_cost_action, lowest_cost),
+        (highest_match_action, highest_match),
+    ):
+        expected = edit_distance_backpointer(a, b, generic)
+        assert engines.inline_dp(a, b, action, same, True) == expected
+        assert engines.inline_dp(a, b, action, same) == (*expected[:2], None)
+
+
+@given(pairs, st.integers(0, 5))
+def test_levenshtein(pair, k):
+    """The distance-only computation agrees with the full one."""
+    a, b = pair
+    expected = edit_distance(a, b, lowest_cost)[0]
+    assert levenshtein(a, b) == expected
+    assert levenshtein(a, b, test=same) == expected
+    assert levenshtein(a, b, max_distance=k) == min(expected, k + 1)
+    assert levenshtein(a, b, test=same, max_distance=k) == min(expected, k + 1)
+    with mock.patch.object(engines, "SHORT_SEQUENCE", 0):
+        assert levenshtein(a, b, max_distance=k) == min(expected, k + 1)
+    assert engines.distance_dp(a, b, same) == expected
+    assert engines.diagonal_distance(a, b, same, len(a) + len(b)) == expected
+    if a:
+        assert engines.myers_distance(a, b) == expected
+
+
+@given(st.lists(st.lists(st.integers(0, 3), min_size=7, max_size=7), min_size=1))
+def test_backpointer_table(rows):
+    """Packing rows of backpointers at 2 bits per cell loses nothing."""
+    table = engines.BackpointerTable(7)
+    for row in rows:
+        table.append(bytearray(row))
+    assert len(table) == len(rows)
+    for i, row in enumerate(rows):
+        for j, code in enumerate(row):
+            assert table.action(i, j) == engines.ACTIONS[code]
+
+
+@given(pairs, st.integers(0, 5))
+def test_compiled_pattern(pair, k):
+    """A compiled pattern gives the same results as the functions."""
+    a, b = pair
+    for action in (lowest_cost_action, highest_match_action, lowest_cost):
+        for test in (operator.eq, same):
+            expected = edit_distance_backpointer(a, b, action, test)
+            pattern = compile_pattern(a, test, action)
+            assert pattern.edit_distance_backpointer(b) == expected
+            assert pattern.edit_distance(b) == expected[:2]
+            assert pattern.distance(b) == expected[0]
+            assert pattern.matches(b) == expected[1]
+            assert pattern.opcodes(b) == expected[2]
+            assert pattern.distance(b, k) == min(expected[0], k + 1)
+
+
+@given(st.lists(st.tuples(st.booleans(), seqs), max_size=6), seqs, seqs)
+def test_sequence_matcher_reuse(changes, a, b):
+    """Replacing either sequence of a matcher (which keeps what it can about
+    the other one) gives the same results as a new matcher."""
+    sm = SequenceMatcher(a, b)
+    for first, seq in [(True, a)] + changes:
+        if first:
+            sm.set_seq1(seq)
+        else:
+            sm.set_seq2(seq)
+        expected = edit_distance_backpointer(sm.seq1, sm.seq2)
+        assert sm.distance() == expected[0]
+        assert sm.matches() == expected[1]
+        assert sm.get_opcodes() == expected[2]
+
+
+@given(st.lists(st.tuples(st.integers(0, 10), seqs), max_size=6), seqs)
+def test_incremental_aligner(changes, a):
+    """Extending and truncating seq2 gives the same results as aligning it
+    from scratch."""
+    for action in (lowest_cost_action, highest_match_action, lowest_cost):
+        for test in (operator.eq, same):
+            aligner = IncrementalAligner(a, test=test, action_function=action)
+            for length, tokens in changes:
+                aligner.truncate(length)
+                aligner.extend(tokens)
+                expected = edit_distance_backpointer(a, aligner.seq2, action, test)
+                assert aligner.distance() == expected[0]
+                assert aligner.matches() == expected[1]
+                assert aligner.get_opcodes() == expected[2]
+
+
+@given(seqs, st.lists(seqs, max_size=8))
+def test_align_nbest(a, hypotheses):
+    """Aligning hypotheses in a trie gives the same results as aligning each
+    one, and pruning only drops hypotheses that can't be the oracle."""
+    for action in (lowest_cost_action, highest_match_action, lowest_cost):
+        expected = [edit_distance(a, hyp, action) for hyp in hypotheses]
+        oracle = None
+        if hypotheses:
+            distances = [dist for dist, _ in expected]
+            oracle = distances.index(min(distances))
+        assert align_nbest(a, hypotheses, action_function=action) == (expected, oracle)
+        results, pruned_oracle = align_nbest(a, hypotheses, same, action, prune=True)
+        assert pruned_oracle == oracle
+        for result, exp in zip(results, expected):
+            assert result is None or result == exp
+
+
+@given(seqs, st.lists(seqs, max_size=8), st.integers(0, 4))
+def test_build_automaton(query, candidates, k):
+    """The automaton accepts exactly the candidates within k edits."""
+    automaton = build_automaton(query, k)
+    for candidate in candidates:
+        dist = edit_distance(query, candidate)[0]
+        assert automaton.accepts(candidate) == (dist <= k)
+        assert automaton.distance(candidate) == min(dist, k + 1)
+
+
+@given(strs, st.lists(strs, max_size=10), st.integers(0, 3))
+def test_lexicon(query, entries, k):
+    """Searching the trie finds exactly the entries within k edits."""
+    expected = {}
+    for entry in entries:
+        dist = edit_distance(query, entry)[0]
+        if dist <= k:
+            expected[entry] = dist
+    results = Lexicon(entries).search(query, k)
+    assert dict(results) == expected
+    assert len(results) == len(expected)
+    assert [dist for _, dist in results] == sorted(expected.values())
+
+
+@given(strs, st.lists(strs, max_size=20), st.integers(0, 4), st.integers(0, 6))
+def test_bk_tree(query, items, r, k):
+    """Queries on the tree give the same distances as a linear scan."""
+    tree = BKTree(items)
+    distances = sorted(levenshtein(query, item) for item in set(items))
+    results = tree.range_query(query, r)
+    assert [dist for _, dist in results] == [d for d in distances if d <= r]
+    nearest = tree.nearest(query, k)
+    assert [dist for _, dist in nearest] == distances[:k]
+    for item, dist in results + nearest:
+        assert levenshtein(query, item) == dist
+
+
+@given(strs, st.lists(strs, max_size=20), st.integers(0, 4), st.integers(0, 6))
+def test_vp_tree(query, items, r, k):
+    """Queries on the tree give the same distances as a linear scan."""
+    tree = VPTree(items)
+    distances = sorted(levenshtein(query, item) for item in items)
+    results = tree.range_query(query, r)
+    assert [dist for _, dist in results] == [d for d in distances if d <= r]
+    nearest = tree.nearest(query, k)
+    assert [dist for _, dist in nearest] == distances[:k]
+    for index, dist in results + nearest:
+        assert levenshtein(query, items[index]) == dist
+
+
+@given(
+    seqs,
+    st.lists(seqs, max_size=10),
+    st.integers(0, 3),
+    st.sampled_from([None, 4, 6]),
+    st.booleans(),
+)
+def test_deletion_index(query, entries, k, prefix_length, hashes_only):
+    """Searching the index finds exactly the entries within k edits."""
+    index = DeletionIndex(entries, 3, prefix_length, hashes_only)
+    expected = [(entry, levenshtein(query, entry)) for entry in entries]
+    expected = [(entry, dist) for entry, dist in expected if dist <= k]
+    assert index.search(query, k) == sorted(expected, key=lambda result: result[1])
+
+
+@given(
+    seqs,
+    st.lists(seqs, max_size=10),
+    st.integers(0, 3),
+    st.integers(1, 4),
+    st.sets(st.integers(0, 9)),
+)
+def test_qgram_index(query, entries, k, q, removed):
+    """Searching the index finds exactly the entries within k edits, after
+    some have been removed."""
+    index = QGramIndex(entries, q)
+    removed = {number for number in removed if number < len(entries)}
+    for number in removed:
+        index.remove(number)
+    expected = []
+    for number, entry in enumerate(entries):
+        dist = levenshtein(query, entry)
+        if number not in removed and dist <= k:
+            expected.append((dist, number))
+    assert index.search(query, k) == [
+        (number, dist) for dist, number in sorted(expected)
+    ]
+
+
+@given(st.lists(seqs, max_size=8), st.lists(seqs, max_size=8), st.integers(0, 3))
+def test_similarity_join(first, second, k):
+    """The join gives the same pairs as comparing every pair."""
+    expected = []
+    for j, y in enumerate(second):
+        for i, x in enumerate(first):
+            dist = levenshtein(x, y)
+            if dist <= k:
+                expected.append((i, j, dist))
+    assert list(similarity_join(first, second, k)) == expected
+
+
+def same(x, y):
+    """Same as operator.eq, but not recognized by the fast paths."""
+    return x == y
+
+
+def lowest_cost(*args):
+    """Same policy as lowest_cost_action, but not recognized by the fast paths,
+    so the generic dynamic program is used."""
+    return lowest_cost_action(*args)
+
+
+def highest_match(*args):
+    """Same policy as highest_match_action, but not recognized by the fast
+    paths."""
+    return highest_match_action(*args)
+
+
 def wagner_fischer(a, b):
     """Reference Levenshtein distance using the full DP table."""
     m, n = len(a), len(b)
@@ -0,0 +1,77 @@
+# Copyright 2013-2020 Ben Lambert
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the NumPy engines, which are skipped if NumPy isn't installed.
+"""
+from unittest import mock
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from edit_distance import edit_distance, highest_match_action, lowest_cost_action
+
+vectorized = pytest.importorskip("edit_distance.vectorized")
+
+ints = st.lists(st.integers(0, 3), max_size=12)
+strs = st.text("abc", max_size=12)
+pairs = st.tuples(ints, ints) | st.tuples(strs, strs)
+
+
+@given(pairs)
+def test_anti_diagonals(pair):
+    """The anti-diagonal sweep gives the same distance and matches as the
+    dynamic program, for both action functions."""
+    a, b = pair
+    for action in (lowest_cost_action, highest_match_action):
+        expected = edit_distance(a, b, lambda *args, f=action: f(*args))
+        assert vectorized.edit_distance_vectorized(a, b, action) == expected
+
+
+@given(st.lists(pairs, max_size=8))
+def test_batch(batch):
+    """Filling in the rows for a batch of pairs at once gives the same
+    results as one pair at a time."""
+    for action in (lowest_cost_action, highest_match_action):
+        with mock.patch.object(vectorized, "MIN_BATCH", 1):
+            dist, matches = vectorized.edit_distance_batch(batch, action)
+        expected = [
+            edit_distance(a, b, lambda *args, f=action: f(*args)) for a, b in batch
+        ]
+        assert list(zip(dist.tolist(), matches.tolist())) == expected
+
+
+@given(st.lists(pairs, max_size=30), st.integers(1, 4))
+def test_batch_schedule(batch, min_batch):
+    """However the pairs are split into batches, the results come back in
+    the original order."""
+    expected = [edit_distance(a, b) for a, b in batch]
+    with mock.patch.object(vectorized, "MIN_BATCH", min_batch):
+        dist, matches = vectorized.edit_distance_batch(batch, max_memory=256)
+    assert list(zip(dist.tolist(), matches.tolist())) == expected
+
+
+def test_vectorized():
+    """A few fixed cases, and the action functions that can't be vectorized."""
+    ref = ["hi", "there", "how", "are", "you"]
+    hyp = ["hi", "here", "how", "are", "you", "doing"]
+    assert vectorized.edit_distance_vectorized(ref, hyp) == (2, 4)
+    assert vectorized.edit_distance_vectorized("", "abc") == (3, 0)
+    assert vectorized.edit_distance_vectorized("kitten", "sitting") == (3, 4)
+    with pytest.raises(ValueError):
+        vectorized.edit_distance_vectorized("a", "b", lambda *args: "equal")
+    dist, matches = vectorized.edit_distance_batch([(ref, hyp), ("", ""), ("ab", "")])
+    assert dist.tolist() == [2, 0, 2]
+    assert matches.tolist() == [4, 0, 0]